@@ -0,0 +1,144 @@
+import argparse
+import json
+import multiprocessing
+import os
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from freecell_deals import deal_position, iter_ms_deals
+from freecell_optimize import optimize_solution
+from freecell_solver import FreeCellSolver, STRATEGIES
+from freecell_visited import VISITED_BACKENDS
+
+# Batch solving of many deals over a process pool.
+#
+# Deals files are JSON lines. Each line is either a tableau (a list of
+# columns of "7 of Spades" style cards), an object with an "id", a
+# "tableau" and optionally "free_cells" and "foundations", or a Microsoft
+# deal number or inclusive range such as "1-32000" (see freecell_deals).
+# Blank lines and lines starting with '#' are skipped.
+
+MS_RANGE_RE = re.compile(r'^(\d+)(?:\s*-\s*(\d+))?$')
+
+
+def read_deals(lines):
+    # Lazily parse deals from an iterable of lines
+    for line_number, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        match = MS_RANGE_RE.match(line)
+        if match:
+            start = int(match.group(1))
+            yield from iter_ms_deals(start, int(match.group(2) or start))
+            continue
+        deal = json.loads(line)
+        if isinstance(deal, list):
+            deal = {'tableau': deal}
+        deal.setdefault('id', line_number)
+        yield deal
+
+
+def solve_deal(deal, strategy="weighted", heuristic=None, weight=None, timeout=None, options=None, node_limit=None,
+               optimize=False, cancel=None):
+    # Worker entry point: solve one deal and return a JSON-serialisable
+    # result. options are extra FreeCellSolver keyword arguments. An
+    # unsolved deal reports its best partial progress (cards home). With
+    # optimize, a solution is replaced by its shortened single-card form.
+    # cancel is passed on to solve (an Event, e.g. from a Manager).
+    start = time.perf_counter()
+    position = deal_position(deal)
+    solver = FreeCellSolver(*position, **(options or {}))
+    moves = solver.solve(strategy, heuristic, weight, time_limit=timeout, node_limit=node_limit, cancel=cancel)
+    result = {}
+    if optimize and moves is not None:
+        moves, result['optimized'] = optimize_solution(*position, moves)
+    return dict({
+        'id': deal.get('id'),
+        'status': solver.status,
+        'moves': moves,
+        'num_moves': len(moves) if moves is not None else None,
+        'nodes': solver.nodes_expanded,
+        'progress': solver.progress,
+        'visited': solver.visited_states.stats(),
+        'wall_time': time.perf_counter() - start,
+    }, **result)
+
+
+def solve_many(deals, workers=None, timeout_per_deal=None, strategy="weighted", heuristic=None, weight=None,
+               options=None, node_limit=None, optimize=False):
+    # Solve deals across a process pool and yield each result as soon as its
+    # deal completes (not in input order). Deals are submitted lazily, at
+    # most two per worker in flight, so huge inputs never sit in memory.
+    # Closing the generator early cancels every deal not yet started and
+    # signals the running ones to stop, which they do within 256 nodes.
+    workers = workers or os.cpu_count() or 1
+    with multiprocessing.Manager() as manager, ProcessPoolExecutor(max_workers=workers) as pool:
+        cancel = manager.Event()
+        pending = {}
+        deals = iter(deals)
+        try:
+            exhausted = False
+            while pending or not exhausted:
+                while not exhausted and len(pending) < 2 * workers:
+                    deal = next(deals, None)
+                    if deal is None:
+                        exhausted = True
+                        break
+                    future = pool.submit(solve_deal, deal, strategy, heuristic, weight, timeout_per_deal, options,
+                                         node_limit, optimize, cancel)
+                    pending[future] = deal
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    deal = pending.pop(future)
+                    error = future.exception()
+                    if error is not None:
+                        yield {'id': deal['id'], 'status': 'error', 'error': str(error)}
+                    else:
+                        yield future.result()
+        finally:
+            cancel.set()
+            for future in pending:
+                future.cancel()
+            # Wait for the running deals to notice, while the manager is still up
+            pool.shutdown(wait=True, cancel_futures=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Solve many FreeCell deals in parallel")
+    parser.add_argument("deals", help="JSON lines file of deals, or - for stdin")
+    parser.add_argument("-j", "--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument("-t", "--timeout", type=float, default=None, help="time limit per deal in seconds")
+    parser.add_argument("-n", "--node-limit", type=int, default=None, help="expanded-node budget per deal")
+    parser.add_argument("-s", "--strategy", choices=sorted(STRATEGIES), default="weighted")
+    parser.add_argument("--heuristic", default=None)
+    parser.add_argument("--weight", type=float, default=None)
+    parser.add_argument("--visited", choices=VISITED_BACKENDS, default="exact",
+                        help="visited-state backend of dfs (clock and bloom need --memory-limit)")
+    parser.add_argument("--memory-limit", type=int, default=None, help="search memory ceiling per deal in bytes")
+    parser.add_argument("--fp-rate", type=float, default=0.001, help="target false-positive rate for --visited bloom")
+    parser.add_argument("--optimize", action="store_true", help="shorten solutions into single-card moves")
+    parser.add_argument("-o", "--output", default="-", help="JSON lines results file (default: stdout)")
+    args = parser.parse_args(argv)
+    if args.visited != "exact" and args.memory_limit is None:
+        parser.error(f"--visited {args.visited} needs --memory-limit")
+
+    deals_file = sys.stdin if args.deals == "-" else open(args.deals)
+    output = sys.stdout if args.output == "-" else open(args.output, "w")
+    try:
+        options = {'visited': args.visited, 'memory_limit': args.memory_limit, 'fp_rate': args.fp_rate}
+        for result in solve_many(read_deals(deals_file), args.workers, args.timeout,
+                                 args.strategy, args.heuristic, args.weight, options, args.node_limit,
+                                 args.optimize):
+            output.write(json.dumps(result) + "\n")
+            output.flush()
+    finally:
+        if deals_file is not sys.stdin:
+            deals_file.close()
+        if output is not sys.stdout:
+            output.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,264 @@
+import argparse
+import json
+import multiprocessing
+import platform
+import resource
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from freecell_batch import solve_deal
+from freecell_deals import ms_deal
+from freecell_instrument import SearchMonitor, print_progress
+from freecell_solver import FreeCellSolver, DEFAULT_RULES, PRUNING_RULES
+
+# Same deal as the preset GUI (freecell_preset.py), kept here so the benchmark runs without Tk
+PRESET_TABLEAU = [
+    ['5 of Diamonds', 'Q of Hearts', '7 of Spades', '7 of Clubs', '2 of Clubs', '5 of Hearts', '10 of Spades'],
+    ['4 of Spades', 'A of Hearts', '4 of Hearts', '8 of Diamonds', '8 of Clubs', '8 of Spades', '10 of Hearts'],
+    ['6 of Diamonds', '5 of Clubs', '10 of Clubs', '7 of Hearts', '6 of Clubs', '4 of Clubs', 'K of Diamonds'],
+    ['9 of Diamonds', '2 of Hearts', 'Q of Spades', '3 of Hearts', 'Q of Diamonds', '7 of Diamonds', 'Q of Clubs'],
+    ['A of Clubs', 'J of Spades', '8 of Hearts', '4 of Diamonds', 'J of Clubs', 'K of Hearts'],
+    ['K of Clubs', 'A of Diamonds', '9 of Clubs', 'J of Diamonds', 'J of Hearts', 'K of Spades'],
+    ['3 of Diamonds', '3 of Spades', 'A of Spades', '3 of Clubs', '9 of Spades', '2 of Spades'],
+    ['5 of Spades', '6 of Spades', '9 of Hearts', '10 of Diamonds', '2 of Diamonds', '6 of Hearts']
+]
+
+
+# Pinned benchmark corpus: Microsoft deal numbers, tiered by how hard they
+# were for weighted search (w=5) when pinned. Never edit a tier in place;
+# add new tiers instead so old baselines stay comparable.
+CORPUS = {
+    'easy': [33, 51, 58, 60, 65, 80],  # < 200 nodes
+    'medium': [1, 2, 3, 4, 5, 13],  # 400 - 2000 nodes
+    'hard': [6, 12, 19, 41, 83, 124],  # 5000 - 20000 nodes
+    'unsolvable': [11982],  # The one unsolvable deal in 1..32000
+}
+UNSOLVABLE_TIERS = ('unsolvable',)  # Tiers where the right answer is 'unsolved'
+
+# Solver configurations run over the corpus: solve() arguments plus
+# FreeCellSolver keyword arguments under 'options'
+CONFIGS = {
+    'weighted-5': {'strategy': 'weighted', 'weight': 5.0},
+    'weighted-2': {'strategy': 'weighted', 'weight': 2.0},
+    'idastar-3': {'strategy': 'idastar', 'weight': 3.0},
+    'dfs': {'strategy': 'dfs'},
+}
+
+RESULTS_VERSION = 2
+
+
+def measure_nodes_per_sec(tableau, max_nodes):
+    # Run the DFS until it has expanded max_nodes states (rounded up to the
+    # solver's 256-node polling interval) and time it
+    solver = FreeCellSolver(tableau, [None] * 4, [[] for _ in range(4)])
+    start = time.perf_counter()
+    solver.solve(node_limit=max_nodes)
+    elapsed = time.perf_counter() - start
+    return solver.nodes_expanded, elapsed
+
+
+def measure_rules(tableau, strategy="weighted", weight=5.0):
+    # Solve with the default pruning rules, then with each of them switched
+    # off in turn and each optional rule switched on
+    configs = [("default rules", DEFAULT_RULES), ("all rules", PRUNING_RULES), ("no rules", ())]
+    configs += [(f"without {rule}", tuple(r for r in DEFAULT_RULES if r != rule)) for rule in DEFAULT_RULES]
+    configs += [(f"with {rule}", DEFAULT_RULES + (rule,)) for rule in PRUNING_RULES if rule not in DEFAULT_RULES]
+    results = []
+    for name, rules in configs:
+        solver = FreeCellSolver(tableau, [None] * 4, [[] for _ in range(4)], rules=rules)
+        start = time.perf_counter()
+        solution = solver.solve(strategy, weight=weight)
+        elapsed = time.perf_counter() - start
+        results.append((name, solver.nodes_expanded, elapsed, len(solution) if solution else None, dict(solver.stats)))
+    return results
+
+
+def profile_deal(tableau, strategy="weighted", weight=None, timeout=None, sample_every=1, interval=1.0):
+    # One instrumented solve with live progress on stderr; returns the final snapshot
+    monitor = SearchMonitor(sample_every, time_phases=True, reporter=print_progress, interval=interval)
+    solver = FreeCellSolver(tableau, [None] * 4, [[] for _ in range(4)], monitor=monitor)
+    solver.solve(strategy, weight=weight, time_limit=timeout)
+    return solver.status, monitor.snapshot()
+
+
+def bench_deal(deal, config, timeout):
+    # Runs in a fresh process per deal so ru_maxrss is the peak of this solve
+    result = solve_deal(deal, config.get('strategy', 'dfs'), config.get('heuristic'), config.get('weight'),
+                        timeout, config.get('options'))
+    result.pop('moves')
+    result.pop('visited')
+    result['peak_rss_kb'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return result
+
+
+def expected_status(tier):
+    return 'unsolved' if tier in UNSOLVABLE_TIERS else 'solved'
+
+
+def summarize(results):
+    # A deal counts as solved when the search reached the right answer:
+    # a solution, or on an unsolvable tier a completed search without one
+    correct = [r for r in results if r['status'] == expected_status(r['tier'])]
+    solved = [r for r in results if r['status'] == 'solved']
+    nodes = sum(r['nodes'] for r in results)
+    wall_time = sum(r['wall_time'] for r in results)
+    return {
+        'deals': len(results),
+        'solved': len(correct),
+        'solve_rate': len(correct) / len(results) if results else 0.0,
+        'nodes': nodes,
+        'wall_time': wall_time,
+        'nodes_per_sec': nodes / wall_time if wall_time else 0.0,
+        'mean_solution_length': sum(r['num_moves'] for r in solved) / len(solved) if solved else None,
+        'peak_rss_kb': max((r['peak_rss_kb'] for r in results), default=0),
+    }
+
+
+def run_suite(configs=None, corpus=None, timeout=30.0, workers=1):
+    # Every (config, deal) pair runs in its own spawned process. Keep
+    # workers at 1 for timings that compare across runs.
+    configs = configs or CONFIGS
+    corpus = corpus or CORPUS
+    context = multiprocessing.get_context("spawn")
+    report = {
+        'version': RESULTS_VERSION,
+        'created': time.strftime("%Y-%m-%dT%H:%M:%S"),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'timeout': timeout,
+        'corpus': corpus,
+        'configs': {},
+    }
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context, max_tasks_per_child=1) as pool:
+        for name, config in configs.items():
+            jobs = [(tier, pool.submit(bench_deal, {'id': number, 'tableau': ms_deal(number)}, config, timeout))
+                    for tier, numbers in corpus.items() for number in numbers]
+            deals = []
+            for tier, job in jobs:
+                result = job.result()
+                result['tier'] = tier
+                deals.append(result)
+            report['configs'][name] = {
+                'config': config,
+                'summary': summarize(deals),
+                'tiers': {tier: summarize([d for d in deals if d['tier'] == tier]) for tier in corpus},
+                'deals': deals,
+            }
+    return report
+
+
+def compare(report, baseline, tolerance=0.25):
+    # Return a list of regressions of report against baseline. Node counts
+    # are deterministic, so they are checked per deal; times only overall.
+    # Results of another RESULTS_VERSION mean something else and raise ValueError.
+    if baseline.get('version') != report['version']:
+        raise ValueError(f"baseline is results version {baseline.get('version')}, "
+                         f"this run is version {report['version']}; rerun the baseline")
+    regressions = []
+    for name, current in report['configs'].items():
+        # A solution to an unsolvable deal is wrong whatever the baseline says
+        for deal in current['deals']:
+            if deal['tier'] in UNSOLVABLE_TIERS and deal['status'] == 'solved':
+                regressions.append(f"{name}: deal {deal['id']} ({deal['tier']}) solved, but it is unsolvable")
+        old = baseline['configs'].get(name)
+        if old is None:
+            continue
+        old_summary, summary = old['summary'], current['summary']
+        if summary['solve_rate'] < old_summary['solve_rate']:
+            regressions.append(f"{name}: solve rate {old_summary['solve_rate']:.2%} -> {summary['solve_rate']:.2%}")
+        if summary['nodes_per_sec'] < old_summary['nodes_per_sec'] * (1 - tolerance):
+            regressions.append(f"{name}: nodes/sec {old_summary['nodes_per_sec']:.0f} -> {summary['nodes_per_sec']:.0f}")
+        if summary['peak_rss_kb'] > old_summary['peak_rss_kb'] * (1 + tolerance):
+            regressions.append(f"{name}: peak RSS {old_summary['peak_rss_kb']} -> {summary['peak_rss_kb']} KB")
+        old_deals = {(d['tier'], d['id']): d for d in old['deals']}
+        for deal in current['deals']:
+            old_deal = old_deals.get((deal['tier'], deal['id']))
+            if old_deal is None:
+                continue
+            label = f"{name}: deal {deal['id']} ({deal['tier']})"
+            expected = expected_status(deal['tier'])
+            if deal['tier'] in UNSOLVABLE_TIERS and deal['status'] == 'solved':
+                continue  # Already reported above
+            if old_deal['status'] == expected and deal['status'] != expected:
+                regressions.append(f"{label} no longer {expected} ({deal['status']})")
+            elif deal['status'] == expected and old_deal['status'] == expected:
+                if deal['nodes'] > old_deal['nodes'] * (1 + tolerance):
+                    regressions.append(f"{label} nodes {old_deal['nodes']} -> {deal['nodes']}")
+                if expected == 'solved' and deal['num_moves'] > old_deal['num_moves'] * (1 + tolerance):
+                    regressions.append(f"{label} solution length {old_deal['num_moves']} -> {deal['num_moves']}")
+    return regressions
+
+
+def print_report(report):
+    for name, result in report['configs'].items():
+        summary = result['summary']
+        length = summary['mean_solution_length']
+        print(f"{name:12} solved {summary['solved']}/{summary['deals']}  nodes {summary['nodes']:8}  "
+              f"{summary['wall_time']:7.2f}s  {summary['nodes_per_sec']:7.0f} nodes/sec  "
+              f"mean length {length if length is None else round(length, 1)}  peak RSS {summary['peak_rss_kb']} KB")
+        for tier, tier_summary in result['tiers'].items():
+            print(f"    {tier:10} solved {tier_summary['solved']}/{tier_summary['deals']}  "
+                  f"nodes {tier_summary['nodes']:8}  {tier_summary['wall_time']:7.2f}s")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="FreeCell solver benchmarks")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    suite = commands.add_parser("suite", help="run the pinned corpus through every solver configuration")
+    suite.add_argument("-o", "--output", default="bench_results.json", help="results file to write")
+    suite.add_argument("-b", "--baseline", help="results file to compare against; regressions exit with status 1")
+    suite.add_argument("-c", "--config", action="append", choices=sorted(CONFIGS), help="only run these configs")
+    suite.add_argument("-t", "--timeout", type=float, default=30.0, help="time limit per deal in seconds")
+    suite.add_argument("-j", "--workers", type=int, default=1)
+    suite.add_argument("--tolerance", type=float, default=0.25, help="allowed relative slowdown before failing")
+
+    nps = commands.add_parser("nps", help="DFS nodes/sec on the preset deal")
+    nps.add_argument("max_nodes", type=int, nargs="?", default=20000)
+
+    commands.add_parser("rules", help="nodes expanded with each pruning rule switched off")
+
+    profile = commands.add_parser("profile", help="instrumented solve of one deal with live progress")
+    profile.add_argument("deal", type=int, nargs="?", default=None,
+                         help="Microsoft deal number (default: the preset deal)")
+    profile.add_argument("-s", "--strategy", default="weighted")
+    profile.add_argument("--weight", type=float, default=None)
+    profile.add_argument("-t", "--timeout", type=float, default=None)
+    profile.add_argument("--sample", type=int, default=1, help="record one expansion in N")
+    profile.add_argument("--interval", type=float, default=1.0, help="seconds between progress lines")
+    args = parser.parse_args(argv)
+
+    if args.command == "nps":
+        nodes, elapsed = measure_nodes_per_sec(PRESET_TABLEAU, args.max_nodes)
+        print(f"{nodes} nodes in {elapsed:.3f}s: {nodes / elapsed:.0f} nodes/sec")
+    elif args.command == "rules":
+        for name, nodes, elapsed, length, stats in measure_rules(PRESET_TABLEAU):
+            print(f"{name:32} {nodes:8} nodes {elapsed:7.2f}s  moves={length}  {stats}")
+    elif args.command == "profile":
+        tableau = PRESET_TABLEAU if args.deal is None else ms_deal(args.deal)
+        status, snapshot = profile_deal(tableau, args.strategy, args.weight, args.timeout, args.sample,
+                                        args.interval)
+        print(json.dumps(dict(snapshot, status=status), indent=1))
+    else:
+        configs = {name: CONFIGS[name] for name in args.config} if args.config else CONFIGS
+        report = run_suite(configs, timeout=args.timeout, workers=args.workers)
+        with open(args.output, "w") as output:
+            json.dump(report, output, indent=1)
+        print_report(report)
+        if args.baseline:
+            with open(args.baseline) as baseline_file:
+                baseline = json.load(baseline_file)
+            try:
+                regressions = compare(report, baseline, args.tolerance)
+            except ValueError as error:
+                sys.exit(f"\nCannot compare against {args.baseline}: {error}")
+            if regressions:
+                print(f"\n{len(regressions)} regression(s) against {args.baseline}:")
+                for regression in regressions:
+                    print(f"  {regression}")
+                sys.exit(1)
+            print(f"\nNo regressions against {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+import tkinter as tk
+
+# Retained card display for the GUIs. Every card has one label, created once
+# and never destroyed; showing a position re-packs labels into the pile
+# frames. update() compares the new piles with the ones last shown and only
+# touches the piles that changed, and within such a pile only the cards past
+# the part that stayed the same, so playing a move back costs a couple of
+# pack calls rather than a rebuild of the board.
+#
+# Piles are identified by any hashable id the GUI chooses, e.g. ('tableau', 3).
+# The labels are children of the root, so they can be packed into any pile
+# frame; they are created after the frames so they draw on top of them.
+
+
+class CardBoard:
+    def __init__(self, root, cards, on_press=None):
+        self.root = root
+        self.labels = {}
+        for card in cards:
+            label = tk.Label(root, text=card)
+            if on_press is not None:
+                label.bind("<Button-1>", lambda event, c=card: on_press(event, c))
+            self.labels[card] = label
+        self.frames = {}  # pile id -> (frame, pack options)
+        self.shown = {}  # pile id -> cards as last shown
+        self.location = {}  # card -> pile id it is shown in
+        self.dirty = set()  # Piles to re-pack on the next update whatever they hold
+
+    def add_pile(self, pile, frame, **pack_options):
+        self.frames[pile] = (frame, pack_options)
+        self.shown[pile] = ()
+
+    def pile_of(self, card):
+        return self.location.get(card)
+
+    def update(self, piles):
+        # piles maps pile id -> cards bottom to top; piles left out keep
+        # their cards, and a card in no pile is hidden only if its old pile
+        # was given
+        changed = []
+        for pile, cards in piles.items():
+            cards = tuple(card for card in cards if card)
+            if cards != self.shown[pile] or pile in self.dirty:
+                changed.append((pile, cards))
+        for pile in self.dirty:
+            if pile not in piles:
+                changed.append((pile, self.shown[pile]))
+        self.dirty.clear()
+        if not changed:
+            return
+        # Take the stale tops off every changed pile before packing anything,
+        # so a card moving between two changed piles is not unpacked after
+        # it has been packed in its new place
+        packs = []
+        for pile, cards in changed:
+            frame, options = self.frames[pile]
+            slaves = frame.pack_slaves()
+            wanted = [self.labels[card] for card in cards]
+            same = 0
+            while same < len(slaves) and same < len(wanted) and slaves[same] is wanted[same]:
+                same += 1
+            for label in slaves[same:]:
+                label.pack_forget()
+            for card in self.shown[pile]:
+                if self.location.get(card) == pile:
+                    del self.location[card]
+            packs.append((frame, options, wanted[same:]))
+            self.shown[pile] = cards
+        for pile, cards in changed:
+            for card in cards:
+                self.location[card] = pile
+        for frame, options, labels in packs:
+            for label in labels:
+                label.pack(in_=frame, **options)
+
+    def lift(self, card, x, y):
+        # Take a card out of its pile to follow the pointer (root coordinates)
+        label = self.labels[card]
+        label.place(in_=self.root, x=x, y=y)
+        label.lift()
+
+    def drop(self, card):
+        # Put a lifted card back into its pile on the next update, whether or
+        # not the model moved it
+        self.labels[card].place_forget()
+        pile = self.location.get(card)
+        if pile is not None:
+            self.dirty.add(pile)
+
+    def highlight(self, card, color):
+        self.labels[card].config(bg=color)
@@ -0,0 +1,223 @@
+import hashlib
+import inspect
+import json
+import os
+import sqlite3
+import time
+from collections import OrderedDict
+from freecell_cards import encode_position, pack_state, unpack_state, zobrist_key, ZOBRIST
+from freecell_solver import FreeCellSolver, STRATEGIES, match_layout, remap_move
+
+# Persistent cache of solve results, in SQLite.
+#
+# Entries are keyed by the Zobrist key of the starting position, which does
+# not depend on column or free-cell order, extended with the foundation
+# heights (see position_key), plus a version stamp hashed from the solver
+# settings, so a result is only reused for the settings that produced it.
+# 'solved' results are kept, and so are 'unsolved' ones from exhaustive
+# searches (no depth cap and an exact visited set, see is_final), which
+# prove the position unsolvable; timeouts, other aborted searches and
+# lossy searches are not. The stored moves are remapped onto the layout they are
+# requested for. A small in-memory LRU in front of the database serves
+# repeated lookups without touching SQLite, and the database is trimmed,
+# least recently used first, once its entries pass max_bytes.
+
+CACHE_FORMAT = 2
+CACHED_STATUSES = ('solved', 'unsolved')
+DEFAULT_CACHE_PATH = os.path.join(os.path.expanduser("~"), ".cache", "freecell", "solutions.sqlite")
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    key INTEGER NOT NULL,
+    version TEXT NOT NULL,
+    layout BLOB NOT NULL,
+    status TEXT NOT NULL,
+    moves TEXT,
+    size INTEGER NOT NULL,
+    last_used REAL NOT NULL,
+    PRIMARY KEY (key, version)
+)
+"""
+
+
+# FreeCellSolver arguments that can change a solve's result, with their defaults
+SOLVER_DEFAULTS = {name: parameter.default
+                   for name, parameter in inspect.signature(FreeCellSolver).parameters.items()
+                   if name in ('max_depth', 'supermoves', 'auto_foundation', 'rules', 'visited', 'fp_rate')}
+
+
+def settings_version(strategy, heuristic=None, weight=None, options=None):
+    # Version stamp of the solve settings; options are FreeCellSolver keyword arguments
+    default_heuristic, default_weight = STRATEGIES[strategy]
+    heuristic = heuristic or default_heuristic
+    if callable(heuristic):
+        heuristic = getattr(heuristic, '__name__', repr(heuristic))
+    settings = {name: (options or {}).get(name, default) for name, default in SOLVER_DEFAULTS.items()}
+    settings.update(format=CACHE_FORMAT, strategy=strategy, heuristic=heuristic,
+                    weight=default_weight if weight is None else weight, rules=sorted(settings['rules']))
+    return hashlib.sha1(json.dumps(settings, sort_keys=True).encode()).hexdigest()[:16]
+
+
+def position_key(tableau, free_cells, heights):
+    # The solver's Zobrist key leaves out the foundations, which follow from
+    # the other cards in a complete position. The cache also sees positions
+    # with cards missing, so it mixes the heights in. It uses the table rows
+    # of the rank-0 "cards", which no real card ever uses.
+    key = zobrist_key(tableau, free_cells, heights)
+    for suit, height in enumerate(heights):
+        key ^= ZOBRIST[suit][height]
+    return key
+
+
+def is_final(solver):
+    # True if the result of solver's last solve can be cached: a solution,
+    # or an 'unsolved' that proves there is none. Under a depth cap or a
+    # lossy visited backend an 'unsolved' search may have missed a solution.
+    if solver.status == 'unsolved':
+        return solver.max_depth is None and solver.visited_backend == "exact"
+    return solver.status in CACHED_STATUSES
+
+
+def move_from_json(move):
+    # JSON turns move tuples into lists
+    if move[0] == 'Auto':
+        return ('Auto', tuple(tuple(step) for step in move[1]))
+    return tuple(move)
+
+
+def canonical(tableau, free_cells):
+    # Order-independent form of a layout, to rule out Zobrist collisions
+    return sorted(tuple(col) for col in tableau), sorted(free_cells)
+
+
+class SolutionCache:
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_bytes=DEFAULT_MAX_BYTES, memory_entries=1024):
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self.max_bytes = max_bytes
+        # Usable from one thread at a time, not necessarily the one that opened it (see freecell_worker)
+        self.db = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self.db.execute(SCHEMA)
+        self.db.commit()
+        self.memory = OrderedDict()
+        self.memory_entries = memory_entries
+        self.touched = set()  # Keys hit since the last flush, whose last_used is stale
+        self.hits = 0
+        self.misses = 0
+
+    def close(self):
+        self.flush()
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+        return False
+
+    @staticmethod
+    def sql_key(key):
+        # SQLite integers are signed 64-bit
+        return key - (1 << 63)
+
+    def lookup(self, key, version, tableau, free_cells, heights):
+        # (status, moves) for an encoded position, or None on a miss
+        entry = self.memory.get((key, version))
+        if entry is not None:
+            self.memory.move_to_end((key, version))
+        else:
+            row = self.db.execute("SELECT layout, status, moves FROM results WHERE key = ? AND version = ?",
+                                  (self.sql_key(key), version)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            layout, status, moves = row
+            stored_tableau, stored_free_cells, stored_heights = unpack_state(layout)
+            if moves is not None:
+                moves = [move_from_json(move) for move in json.loads(moves)]
+            entry = (stored_tableau, stored_free_cells, stored_heights, status, moves)
+            self.remember((key, version), entry)
+            self.touched.add((key, version))
+        stored_tableau, stored_free_cells, stored_heights, status, moves = entry
+        if stored_heights != heights:
+            self.misses += 1
+            return None  # A different position with the same key
+        if stored_tableau == tableau and stored_free_cells == free_cells:
+            self.hits += 1
+            return status, None if moves is None else list(moves)
+        if canonical(stored_tableau, stored_free_cells) != canonical(tableau, free_cells):
+            self.misses += 1
+            return None  # A different position with the same key
+        self.hits += 1
+        if moves is None:
+            return status, None
+        col_map, cell_map = match_layout(stored_tableau, stored_free_cells, tableau, free_cells)
+        return status, [remap_move(move, col_map, cell_map) for move in moves]
+
+    def store(self, key, version, tableau, free_cells, foundations, status, moves):
+        if status not in CACHED_STATUSES:
+            return
+        layout = pack_state(tableau, free_cells, foundations)
+        encoded_moves = None if moves is None else json.dumps(moves)
+        size = len(layout) + (len(encoded_moves) if encoded_moves else 0)
+        self.db.execute("INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?, ?)",
+                        (self.sql_key(key), version, layout, status, encoded_moves, size, time.time()))
+        self.remember((key, version), ([list(col) for col in tableau], list(free_cells), list(foundations),
+                                       status, moves))
+        self.flush()
+        self.evict()
+
+    def remember(self, memory_key, entry):
+        self.memory[memory_key] = entry
+        self.memory.move_to_end(memory_key)
+        if len(self.memory) > self.memory_entries:
+            self.memory.popitem(last=False)
+
+    def flush(self):
+        # Write out the last_used times of entries hit since the last flush
+        now = time.time()
+        self.db.executemany("UPDATE results SET last_used = ? WHERE key = ? AND version = ?",
+                            [(now, self.sql_key(key), version) for key, version in self.touched])
+        self.touched.clear()
+        self.db.commit()
+
+    def evict(self):
+        # Drop least recently used entries until the total is under 90% of max_bytes
+        total = self.db.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        target = self.max_bytes * 9 // 10
+        for key, version, size in self.db.execute(
+                "SELECT key, version, size FROM results ORDER BY last_used").fetchall():
+            if total <= target:
+                break
+            self.db.execute("DELETE FROM results WHERE key = ? AND version = ?", (key, version))
+            self.memory.pop((key + (1 << 63), version), None)
+            total -= size
+        self.db.commit()
+
+    def stats(self):
+        entries, total = self.db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM results").fetchone()
+        return {'entries': entries, 'bytes': total, 'hits': self.hits, 'misses': self.misses}
+
+    def solve(self, tableau, free_cells, foundations, strategy="weighted", heuristic=None, weight=None, time_limit=None,
+              cancel=None, node_limit=None, **options):
+        # Cached FreeCellSolver(...).solve(...): returns (moves, status, hit).
+        # options are FreeCellSolver keyword arguments.
+        if strategy not in STRATEGIES:
+            raise ValueError(f"Unknown strategy: {strategy!r}")
+        version = settings_version(strategy, heuristic, weight, options)
+        encoded_tableau, encoded_free_cells, heights = encode_position(tableau, free_cells, foundations)
+        key = position_key(encoded_tableau, encoded_free_cells, heights)
+        cached = self.lookup(key, version, encoded_tableau, encoded_free_cells, heights)
+        if cached is not None:
+            status, moves = cached
+            return moves, status, True
+        solver = FreeCellSolver(tableau, free_cells, foundations, **options)
+        moves = solver.solve(strategy, heuristic, weight, time_limit=time_limit, cancel=cancel, node_limit=node_limit)
+        if is_final(solver):
+            self.store(key, version, encoded_tableau, encoded_free_cells, heights, solver.status, moves)
+        return moves, solver.status, False
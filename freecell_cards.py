@@ -0,0 +1,139 @@
+import random
+
+# Compact integer encoding for cards and solver states.
+#
+# A card is a small int: (rank << 2) | suit, where rank is 1..13 and suit is
+# the index into `suits`. Hearts and Diamonds come first, so bit 1 of a card
+# is its colour bit (0 = red, 1 = black). 0 means "no card", which is how an
+# empty free cell is stored.
+
+# Define card suits and values
+suits = ['Hearts', 'Diamonds', 'Clubs', 'Spades']
+values = ['A', '2', '3', '4', '5', '6', '7', '8', '9', '10', 'J', 'Q', 'K']
+
+EMPTY = 0
+NUM_COLUMNS = 8
+NUM_FREE_CELLS = 4
+
+
+def make_card(rank, suit):
+    return (rank << 2) | suit
+
+
+def card_rank(card):
+    return card >> 2
+
+
+def card_suit(card):
+    return card & 3
+
+
+def card_color(card):
+    return (card >> 1) & 1
+
+
+def can_stack(card, onto):
+    # `card` may go on `onto` in the tableau: one rank lower, opposite colour
+    return (onto >> 2) == (card >> 2) + 1 and (onto ^ card) & 2 != 0
+
+
+# Lookup tables between the "7 of Spades" strings used by the GUI and ints
+CARD_BY_NAME = {}
+NAME_BY_CARD = {}
+for _suit_idx, _suit in enumerate(suits):
+    for _rank_idx, _value in enumerate(values):
+        _card = make_card(_rank_idx + 1, _suit_idx)
+        CARD_BY_NAME[f"{_value} of {_suit}"] = _card
+        NAME_BY_CARD[_card] = f"{_value} of {_suit}"
+
+
+def card_from_str(name):
+    if name is None:
+        return EMPTY
+    try:
+        return CARD_BY_NAME[name]
+    except KeyError:
+        raise ValueError(f"Unknown card: {name!r}") from None
+
+
+def card_to_str(card):
+    if card == EMPTY:
+        return None
+    return NAME_BY_CARD[card]
+
+
+def encode_position(tableau, free_cells, foundations):
+    # Convert string based piles into int columns, int free cells and
+    # per-suit foundation heights (indexed like `suits`)
+    int_tableau = [[card_from_str(card) for card in col] for col in tableau]
+    int_free_cells = [card_from_str(card) for card in free_cells]
+    heights = [0] * len(suits)
+    for pile in foundations:
+        for card in pile:
+            heights[card_suit(card_from_str(card))] += 1
+    return int_tableau, int_free_cells, heights
+
+
+def decode_position(tableau, free_cells, foundations):
+    # Inverse of encode_position; foundation piles are rebuilt from heights
+    str_tableau = [[card_to_str(card) for card in col] for col in tableau]
+    str_free_cells = [card_to_str(card) for card in free_cells]
+    str_foundations = [[card_to_str(make_card(rank, suit)) for rank in range(1, height + 1)]
+                       for suit, height in enumerate(foundations)]
+    return str_tableau, str_free_cells, str_foundations
+
+
+def pack_state(tableau, free_cells, foundations):
+    # Pack a whole int-encoded position into one hashable bytes value:
+    # foundation heights, free cells, then each column as a length byte
+    # followed by its cards
+    packed = bytearray(foundations)
+    packed.extend(free_cells)
+    for col in tableau:
+        packed.append(len(col))
+        packed.extend(col)
+    return bytes(packed)
+
+
+def unpack_state(packed, num_free_cells=NUM_FREE_CELLS):
+    num_suits = len(suits)
+    foundations = list(packed[:num_suits])
+    free_cells = list(packed[num_suits:num_suits + num_free_cells])
+    tableau = []
+    pos = num_suits + num_free_cells
+    while pos < len(packed):
+        length = packed[pos]
+        tableau.append(list(packed[pos + 1:pos + 1 + length]))
+        pos += 1 + length
+    return tableau, free_cells, foundations
+
+
+# Zobrist keys for canonical state hashing. Each card not on a foundation
+# contributes one random 64-bit value for its location: the card directly
+# beneath it in a column (EMPTY for the bottom of a column) or FREE_CELL.
+# That describes every column as a chain without saying which column it is
+# in, so the XOR of all contributions ignores column and free-cell order.
+# Foundation cards contribute nothing: their location follows from the rest.
+# The table is seeded so keys agree across processes and runs.
+FREE_CELL = 64
+
+
+def _make_zobrist_table(seed=0xF9EE):
+    rng = random.Random(seed)
+    return [[rng.getrandbits(64) for _location in range(FREE_CELL + 1)] for _card in range(64)]
+
+
+ZOBRIST = _make_zobrist_table()
+
+
+def zobrist_key(tableau, free_cells, foundations):
+    key = 0
+    for col in tableau:
+        below = EMPTY
+        for card in col:
+            key ^= ZOBRIST[card][below]
+            below = card
+    for card in free_cells:
+        if card:
+            key ^= ZOBRIST[card][FREE_CELL]
+    return key
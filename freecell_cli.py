@@ -0,0 +1,91 @@
+import argparse
+import json
+import sys
+from freecell_batch import solve_deal
+from freecell_deals import deal_position, ms_deal, parse_deal
+from freecell_solver import STRATEGIES, expand_solution, format_move, move_notation
+
+# Headless entry point: solve one position from the command line or from
+# Python, without Tk anywhere in the import chain.
+#   python -m freecell_cli deal.txt -s astar -t 10
+#   python -m freecell_cli --ms 617 --format json
+#   python -m freecell_cli < deal.txt
+# Deal files use either layout parse_deal understands (see freecell_deals).
+# Moves are printed in standard notation (see move_notation): columns 1-8,
+# free cells a-d and the foundation h, one single-card move per token. The
+# exit status is 0 when a solution is printed and 1 otherwise.
+
+OUTPUT_FORMATS = ('standard', 'text', 'json')
+
+
+def load_deal(source="-", layout="auto"):
+    # Position dict (tableau, free_cells, foundations) from a deal file, or
+    # from stdin for '-'
+    if source == "-":
+        return parse_deal(sys.stdin.read(), layout)
+    with open(source) as deal_file:
+        return parse_deal(deal_file.read(), layout)
+
+
+def solve(deal, strategy="weighted", heuristic=None, weight=None, time_limit=None, node_limit=None, optimize=True,
+          **options):
+    # Solve a position dict and return a JSON-serialisable result. moves are
+    # single-card moves (string cards), shortened by the optimizer unless
+    # optimize is off, or None without a solution. options are extra
+    # FreeCellSolver keyword arguments.
+    result = solve_deal(deal, strategy, heuristic, weight, time_limit, options, node_limit, optimize)
+    moves = result['moves']
+    if moves is not None and not optimize:
+        moves = expand_solution(*deal_position(deal), moves)
+    return {
+        'status': result['status'],
+        'moves': moves,
+        'notation': None if moves is None else [move_notation(move) for move in moves],
+        'nodes': result['nodes'],
+        'progress': result['progress'],
+        'wall_time': result['wall_time'],
+    }
+
+
+def depth_cap(text):
+    # argparse type of --max-depth: a move count, 0 for no cap
+    depth = int(text)
+    if depth < 0:
+        raise argparse.ArgumentTypeError(f"must be 0 or more, not {depth}")
+    return depth
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Solve a FreeCell position without the GUI")
+    parser.add_argument("deal", nargs="?", default="-", help="deal file, or - for stdin (the default)")
+    parser.add_argument("--ms", type=int, default=None, help="solve Microsoft deal number MS instead of a file")
+    parser.add_argument("--layout", choices=("auto", "columns", "rows"), default="auto", help="deal file layout")
+    parser.add_argument("-s", "--strategy", choices=sorted(STRATEGIES), default="weighted")
+    parser.add_argument("--heuristic", default=None)
+    parser.add_argument("--weight", type=float, default=None)
+    parser.add_argument("-t", "--timeout", type=float, default=None, help="time limit in seconds")
+    parser.add_argument("-n", "--node-limit", type=int, default=None, help="expanded-node budget")
+    parser.add_argument("--max-depth", type=depth_cap, default=None,
+                        help="depth cap of the depth-first strategies (default and 0: no cap)")
+    parser.add_argument("--no-optimize", action="store_true", help="print the solution without shortening it")
+    parser.add_argument("-f", "--format", choices=OUTPUT_FORMATS, default="standard",
+                        help="standard notation, one described move per line, or a JSON result")
+    args = parser.parse_args(argv)
+
+    deal = {'tableau': ms_deal(args.ms)} if args.ms is not None else load_deal(args.deal, args.layout)
+    result = solve(deal, args.strategy, args.heuristic, args.weight, args.timeout, args.node_limit,
+                   not args.no_optimize, max_depth=args.max_depth or None)
+    if args.format == "json":
+        print(json.dumps(result))
+    elif result['moves'] is None:
+        print(f"No solution: {result['status']}, {result['progress']}/52 cards home", file=sys.stderr)
+    elif args.format == "text":
+        for move in result['moves']:
+            print(format_move(move))
+    else:
+        print(" ".join(result['notation']))
+    return 0 if result['moves'] is not None else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
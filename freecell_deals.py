@@ -0,0 +1,146 @@
+import re
+from freecell_cards import suits, values
+
+# Deal sources for the solver: Microsoft FreeCell deal numbers and the usual
+# text notations, all producing the solver's "7 of Spades" string format.
+
+RANK_CHARS = 'A23456789TJQK'
+SUIT_CHARS = {'H': 'Hearts', 'D': 'Diamonds', 'C': 'Clubs', 'S': 'Spades'}
+MS_SUIT_ORDER = 'CDHS'  # Suit order of the Microsoft deck: card n is rank n // 4, suit n % 4
+MAX_MS_DEAL = (1 << 31) - 1
+
+
+def ms_random(seed):
+    # The Microsoft C runtime rand(): 31-bit LCG state, 15-bit outputs
+    state = seed & 0x7FFFFFFF
+    while True:
+        state = (state * 214013 + 2531011) & 0x7FFFFFFF
+        yield state >> 16
+
+
+def ms_deal(number):
+    # Tableau of Microsoft FreeCell deal `number` (1..2**31 - 1; the
+    # original game shipped 1..32000, later versions 1..1000000 with the
+    # same generator). Cards are dealt left to right, row by row.
+    if not 1 <= number <= MAX_MS_DEAL:
+        raise ValueError(f"Deal number out of range: {number}")
+    deck = list(range(51, -1, -1))
+    rand = ms_random(number)
+    for i in range(52):
+        j = 51 - next(rand) % (52 - i)
+        deck[i], deck[j] = deck[j], deck[i]
+    tableau = [[] for _ in range(8)]
+    for i, card in enumerate(deck):
+        suit = SUIT_CHARS[MS_SUIT_ORDER[card % 4]]
+        tableau[i % 8].append(f"{values[card // 4]} of {suit}")
+    return tableau
+
+
+def iter_ms_deals(start=1, stop=32000):
+    # Lazily yield deals start..stop (inclusive) as batch-style deal dicts
+    for number in range(start, stop + 1):
+        yield {'id': number, 'tableau': ms_deal(number)}
+
+
+def parse_card(token):
+    # "7S", "10h", "TH", "qd" or "7 of Spades" -> "7 of Spades"
+    if ' of ' in token:
+        value, suit = token.split(' of ')
+        if value not in values or suit not in suits:
+            raise ValueError(f"Unknown card: {token!r}")
+        return token
+    token = token.strip().upper()
+    rank, suit = token[:-1], token[-1:]
+    if rank == '10':
+        rank = 'T'
+    if len(rank) != 1 or rank not in RANK_CHARS or suit not in SUIT_CHARS:
+        raise ValueError(f"Unknown card: {token!r}")
+    return f"{values[RANK_CHARS.index(rank)]} of {SUIT_CHARS[suit]}"
+
+
+def format_card(card):
+    # "7 of Spades" -> "7S" ("10" becomes "T")
+    value, suit = card.split(' of ')
+    return f"{RANK_CHARS[values.index(value)]}{suit[0]}"
+
+
+FOUNDATION_RE = re.compile(r'([HDCS])-([0-9TJQKA]+)', re.IGNORECASE)
+
+
+def parse_deal(text, layout="auto"):
+    # Parse one position from text. Two layouts are understood:
+    #   columns: one tableau column per line, bottom card first, optionally
+    #            prefixed with ':' (an empty column is a bare ':'), plus
+    #            optional "Freecells:" and "Foundations: H-0 C-2 D-A S-0" lines
+    #            (the fc-solve board format)
+    #   rows:    the deal as Microsoft prints it, eight cards per row
+    #            dealt left to right
+    # "auto" picks columns when there are exactly eight card lines.
+    free_cells = [None] * 4
+    foundations = [[] for _ in range(4)]
+    lines = []
+    for raw in text.splitlines():
+        line = raw.strip()
+        lower = line.lower()
+        if not line or line.startswith('#') or lower.startswith('game'):
+            continue
+        if lower.startswith(('freecells:', 'fc:')):
+            for i, token in enumerate(line.split(':', 1)[1].split()):
+                free_cells[i] = None if token in ('-', '--') else parse_card(token)
+            continue
+        if lower.startswith(('foundations:', 'founds:')):
+            for suit_char, rank in FOUNDATION_RE.findall(line.split(':', 1)[1]):
+                suit = SUIT_CHARS[suit_char.upper()]
+                height = int(rank) if rank.isdigit() else RANK_CHARS.index(rank.upper()) + 1
+                foundations[suits.index(suit)] = [f"{values[r]} of {suit}" for r in range(height)]
+            continue
+        lines.append(line[1:].split() if line.startswith(':') else line.split())
+
+    if layout == "auto":
+        layout = "columns" if len(lines) == 8 else "rows"
+    if layout == "columns":
+        tableau = [[parse_card(token) for token in line] for line in lines]
+        tableau += [[] for _ in range(8 - len(tableau))]
+    elif layout == "rows":
+        tableau = [[] for _ in range(8)]
+        for line in lines:
+            for i, token in enumerate(line):
+                tableau[i].append(parse_card(token))
+    else:
+        raise ValueError(f"Unknown layout: {layout!r}")
+    return {'tableau': tableau, 'free_cells': free_cells, 'foundations': foundations}
+
+
+def deal_position(deal):
+    # (tableau, free_cells, foundations) of a deal dict, whose free cells and
+    # foundations default to empty
+    return deal['tableau'], deal.get('free_cells', [None] * 4), deal.get('foundations', [[] for _ in range(4)])
+
+
+def format_deal(tableau, free_cells=None, foundations=None):
+    # Columns layout text for a position, readable by parse_deal
+    lines = []
+    if free_cells and any(free_cells):
+        lines.append("Freecells: " + " ".join(format_card(card) if card else '-' for card in free_cells))
+    if foundations and any(foundations):
+        heights = {suits[i][0]: len(pile) for i, pile in enumerate(foundations)}
+        lines.append("Foundations: " + " ".join(f"{s}-{RANK_CHARS[heights[s] - 1] if heights[s] else 0}"
+                                                for s in 'HCDS'))
+    for col in tableau:
+        lines.append(": " + " ".join(format_card(card) for card in col) if col else ":")
+    return "\n".join(lines) + "\n"
+
+
+def iter_text_deals(lines, layout="auto"):
+    # Lazily parse a stream of text deals separated by blank lines
+    block = []
+    count = 0
+    for line in lines:
+        if line.strip():
+            block.append(line)
+        elif block:
+            count += 1
+            yield dict(parse_deal("".join(block), layout), id=count)
+            block = []
+    if block:
+        yield dict(parse_deal("".join(block), layout), id=count + 1)
@@ -1,7 +1,8 @@
 import tkinter as tk
-from tkinter import messagebox
-import copy
-from freecell_solver import FreeCellSolver  # Import the solver from another file
+from freecell_board import CardBoard
+from freecell_cache import SolutionCache  # Solves through the solver in freecell_solver
+from freecell_solver import play_move
+from freecell_worker import SolveController
 
 # Define card suits and values
 suits = ['Hearts', 'Diamonds', 'Clubs', 'Spades']
@@ -20,12 +21,15 @@ class FreeCellGUI:
         self.tableau = [[] for _ in range(8)]
         self.free_cells = [None for _ in range(4)]
         self.foundations = [[] for _ in range(4)]
-        self.card_widgets = {}
-        self.selected_card = None
+        self.selected_card = None  # Name of the card being dragged
         self.selected_pile = None
+        self.cache = SolutionCache()  # Solve results persist across Reset and across runs
 
         # Create UI components
         self.create_widgets()
+        self.controller = SolveController(self.root, self.cache, self.solve_button, self.cancel_button,
+                                          self.status_label, self.play_step)
+        self.root.protocol("WM_DELETE_WINDOW", self.close)
 
     def create_widgets(self):
         # Create free cells
@@ -42,7 +46,6 @@ class FreeCellGUI:
             frame = tk.Frame(self.root, width=100, height=200, borderwidth=1, relief="solid")
             frame.grid(row=0, column=i + 4, padx=5, pady=5)
             self.suit_frames[suit] = frame
-            self.display_suit_pile(frame, suit)
 
         # Create tableau frames
         self.tableau_frames = [tk.Frame(self.root, width=100, height=400, borderwidth=1, relief="solid") for _ in range(8)]
@@ -57,27 +60,58 @@ class FreeCellGUI:
         self.reset_button = tk.Button(self.root, text="Reset", command=self.reset_game)
         self.reset_button.grid(row=3, column=0, columnspan=8, pady=10)
 
-    def display_suit_pile(self, frame, suit):
-        # Display all cards in the suit pile
-        for card in self.deck_by_suit[suit]:
-            label = tk.Label(frame, text=card)
-            label.pack(anchor="w", padx=2, pady=2)
-            label.bind("<Button-1>", lambda event, l=label, s=suit: self.start_drag(event, l, s))
-            self.card_widgets[label] = (suit, card)
-
-    def start_drag(self, event, label, suit):
-        self.selected_card = label
-        self.selected_pile = suit
-        label.config(bg="yellow")
+        self.cancel_button = tk.Button(self.root, text="Cancel", command=self.cancel_solve, state="disabled")
+        self.cancel_button.grid(row=4, column=0, columnspan=8, pady=10)
+
+        self.status_label = tk.Label(self.root, text="")
+        self.status_label.grid(row=5, column=0, columnspan=8, pady=5)
+
+        # One label per card, reused for the whole session
+        self.board = CardBoard(self.root, [card for suit in suits for card in self.deck_by_suit[suit]],
+                               on_press=self.start_drag)
+        for i, frame in enumerate(self.tableau_frames):
+            self.board.add_pile(('tableau', i), frame, anchor="w", padx=2, pady=2)
+        for i, frame in enumerate(self.free_cell_frames):
+            self.board.add_pile(('free', i), frame)
+        for suit, frame in self.suit_frames.items():
+            self.board.add_pile(('suit', suit), frame, anchor="w", padx=2, pady=2)
+        self.display_board()
+
+    def piles(self):
+        # The model as board piles. A suit pile shows the cards of that suit
+        # not yet dealt, then the ones played home to it.
+        piles = {('tableau', i): col for i, col in enumerate(self.tableau)}
+        piles.update({('free', i): [card] for i, card in enumerate(self.free_cells)})
+        placed = {card for col in self.tableau for card in col} | set(self.free_cells)
+        for suit, pile in zip(suits, self.foundations):
+            placed.update(pile)
+            piles[('suit', suit)] = [card for card in self.deck_by_suit[suit] if card not in placed] + pile
+        return piles
+
+    def display_board(self):
+        # Bring the board in line with the model; only changed piles are touched
+        self.board.update(self.piles())
+
+    def start_drag(self, event, card):
+        if self.controller.busy():
+            return  # The model must not change under a solve or its playback
+        pile = self.board.pile_of(card)
+        if pile is None or any(card in home for home in self.foundations):
+            return
+        self.selected_card = card
+        self.selected_pile = pile
+        self.board.highlight(card, "yellow")
         self.root.bind("<B1-Motion>", self.drag_card)
         self.root.bind("<ButtonRelease-1>", self.drop_card)
 
     def drag_card(self, event):
         if self.selected_card:
-            self.selected_card.place(x=event.x_root - self.root.winfo_rootx(), y=event.y_root - self.root.winfo_rooty())
+            self.board.lift(self.selected_card, event.x_root - self.root.winfo_rootx(),
+                            event.y_root - self.root.winfo_rooty())
 
     def drop_card(self, event):
         if self.selected_card:
+            card = self.selected_card
             dropped = False
             for i, frame in enumerate(self.tableau_frames):
                 if frame.winfo_rootx() < event.x_root < frame.winfo_rootx() + frame.winfo_width():
@@ -92,63 +126,57 @@ class FreeCellGUI:
                         dropped = True
                         break
 
-            if not dropped:
-                self.selected_card.place_forget()
-                self.selected_card.pack()
-
-            self.selected_card.config(bg="white")
+            # Back into its pile, old or new
+            self.board.drop(card)
+            self.board.highlight(card, "white")
+            self.display_board()
             self.selected_card = None
             self.selected_pile = None
 
         self.root.unbind("<B1-Motion>")
         self.root.unbind("<ButtonRelease-1>")
 
+    def take_selected_card(self):
+        # Remove the selected card from where it was dragged from; a card
+        # from a suit pile is simply dealt
+        kind, index = self.selected_pile
+        if kind == 'tableau':
+            self.tableau[index].remove(self.selected_card)
+        elif kind == 'free':
+            self.free_cells[index] = None
+        return self.selected_card
+
     def place_card_in_tableau(self, col):
-        if self.selected_card:
-            suit, card = self.card_widgets[self.selected_card]
-            self.tableau[col].append(card)
-            self.selected_card.pack_forget()
-            label = tk.Label(self.tableau_frames[col], text=card)
-            label.pack(anchor="w", padx=2, pady=2)
-            label.bind("<Button-1>", lambda event, l=label, c=col: self.select_tableau_card(event, l, c))
-            self.card_widgets[label] = (col, card)
+        if self.selected_card and self.selected_pile != ('tableau', col):
+            self.tableau[col].append(self.take_selected_card())
 
     def place_card_in_free_cell(self, event, cell):
         if self.selected_card and self.free_cells[cell] is None:
-            suit, card = self.card_widgets[self.selected_card]
-            self.free_cells[cell] = card
-            self.selected_card.pack_forget()
-            label = tk.Label(self.free_cell_frames[cell], text=card)
-            label.pack()
-            label.bind("<Button-1>", lambda event, l=label, c=cell: self.select_free_cell_card(event, l, c))
-            self.card_widgets[label] = (cell, card)
-            self.selected_card = None
+            self.free_cells[cell] = self.take_selected_card()
 
     def solve_game(self):
-        solver = FreeCellSolver(self.tableau, self.free_cells, self.foundations)
-        solution = solver.solve()
+        self.controller.solve(self.tableau, self.free_cells, self.foundations)
+
+    def play_step(self, move):
+        play_move(self.tableau, self.free_cells, self.foundations, move)
+        self.display_board()
 
-        if solution:
-            steps = [f"{move[0]} from {move[1]} to {move[2]}" for move in solution]
-            messagebox.showinfo("Solution", "\n".join(steps))
-        else:
-            messagebox.showinfo("Solution", "No solution found")
+    def cancel_solve(self):
+        self.controller.cancel()
+
+    def close(self):
+        # Flush the cache's last_used times before quitting
+        self.controller.close()
+        self.cache.close()
+        self.root.destroy()
 
     def reset_game(self):
+        self.controller.reset()
         self.deck_by_suit = create_deck_by_suit()
         self.tableau = [[] for _ in range(8)]
         self.free_cells = [None for _ in range(4)]
-        for frame in self.tableau_frames:
-            for widget in frame.winfo_children():
-                widget.destroy()
-        for frame in self.free_cell_frames:
-            for widget in frame.winfo_children():
-                widget.destroy()
-        for suit, frame in self.suit_frames.items():
-            for widget in frame.winfo_children():
-                widget.destroy()
-            self.display_suit_pile(frame, suit)
-        self.card_widgets.clear()
+        self.foundations = [[] for _ in range(4)]
+        self.display_board()
         self.selected_card = None
         self.selected_pile = None
 
@@ -0,0 +1,62 @@
+# Heuristics for the best-first search engines in freecell_solver.
+#
+# Every heuristic takes the int-encoded (tableau, free_cells, foundations)
+# position and returns an estimate of the moves still needed. Admissible ones
+# never overestimate, so A* with them returns a shortest solution; the rest
+# are only meant to steer greedy / weighted search towards a solution fast.
+# Admissibility assumes single-card moves: supermoves and auto-move steps
+# move several cards at once, so turn them off on the solver when A* must
+# be optimal.
+
+def zero(tableau, free_cells, foundations):
+    return 0
+
+
+def cards_left(tableau, free_cells, foundations):
+    # Every card not yet on a foundation needs at least one more move
+    return 52 - sum(foundations)
+
+
+def buried_low_cards(tableau, free_cells, foundations):
+    # For each column count the cards sitting on top of its lowest card:
+    # all of them have to move before that card can go home
+    buried = 0
+    for col in tableau:
+        if col:
+            lowest = min(range(len(col)), key=lambda i: col[i] >> 2)
+            buried += len(col) - 1 - lowest
+    return buried
+
+
+def mobility(tableau, free_cells, foundations):
+    # Penalise occupied free cells and non-empty columns
+    occupied = sum(1 for card in free_cells if card)
+    non_empty = sum(1 for col in tableau if col)
+    return occupied + non_empty
+
+
+def combined(tableau, free_cells, foundations):
+    return (cards_left(tableau, free_cells, foundations)
+            + buried_low_cards(tableau, free_cells, foundations)
+            + mobility(tableau, free_cells, foundations))
+
+
+HEURISTICS = {
+    'zero': zero,
+    'cards_left': cards_left,
+    'buried_low_cards': buried_low_cards,
+    'mobility': mobility,
+    'combined': combined,
+}
+
+ADMISSIBLE = {'zero', 'cards_left'}
+
+
+def get_heuristic(heuristic):
+    # Accept either a registered name or any callable with the same signature
+    if callable(heuristic):
+        return heuristic
+    try:
+        return HEURISTICS[heuristic]
+    except KeyError:
+        raise ValueError(f"Unknown heuristic: {heuristic!r}") from None
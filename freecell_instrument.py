@@ -0,0 +1,153 @@
+import sys
+import time
+from collections import Counter
+
+# Opt-in search instrumentation. Attach a SearchMonitor to a solver
+# (solver.monitor = SearchMonitor(...), or FreeCellSolver(..., monitor=...))
+# and solve() reports into it. With no monitor attached the search only
+# pays for an `is not None` test per node.
+#
+# Collected:
+#   expansions, duplicates: every expanded node / every state skipped as already seen
+#   depth_histogram:        expanded nodes per depth (g for best-first searches)
+#   branching factor:       mean number of children per expanded node
+#   phase_times:            seconds spent in solve's phases ('search', 'path')
+#                           and, with time_phases, in the solver's hot methods
+#   depth, progress:        depth of the last recorded expansion and the most
+#                           cards the search has had on the foundations
+# sample_every=N records the histogram, branching and method timings on only
+# one expansion (or call) in N, scaling the timings back up. The reporter,
+# if any, gets snapshot() every `interval` seconds while the search runs.
+
+TIMED_METHODS = ('valid_moves', 'order_moves', 'make_move', 'unmake_move')
+
+
+class SearchMonitor:
+    def __init__(self, sample_every=1, time_phases=False, reporter=None, interval=1.0,
+                 on_expand=None, on_duplicate=None):
+        if sample_every < 1:
+            raise ValueError(f"sample_every must be at least 1: {sample_every}")
+        self.sample_every = sample_every
+        self.time_phases = time_phases
+        self.reporter = reporter
+        self.interval = interval
+        # Extra callbacks, called as on_expand(depth, branching) for sampled
+        # expansions and on_duplicate(depth) for every duplicate
+        self.on_expand = on_expand
+        self.on_duplicate = on_duplicate
+        self.reset()
+
+    def reset(self):
+        self.expansions = 0
+        self.duplicates = 0
+        self.sampled = 0
+        self.children = 0
+        self.depth_histogram = Counter()
+        self.phase_times = Counter()
+        self.depth = 0
+        self.solver = None
+        self.started = None
+        self.next_report = None
+
+    def expand(self, depth, branching):
+        self.expansions += 1
+        if self.expansions % self.sample_every:
+            return
+        self.sampled += 1
+        self.depth = depth
+        self.children += branching
+        self.depth_histogram[depth] += 1
+        if self.on_expand is not None:
+            self.on_expand(depth, branching)
+
+    def duplicate(self, depth):
+        self.duplicates += 1
+        if self.on_duplicate is not None:
+            self.on_duplicate(depth)
+
+    def branching_factor(self):
+        return self.children / self.sampled if self.sampled else 0.0
+
+    def start(self, solver):
+        # Called by solve() before searching
+        self.reset()
+        self.solver = solver
+        self.started = time.perf_counter()
+        self.next_report = self.started + self.interval
+        if self.time_phases:
+            for name in TIMED_METHODS:
+                setattr(solver, name, self.timed(name, getattr(solver, name)))
+
+    def finish(self, solver):
+        # Called by solve() once the search is over, whatever its outcome
+        if self.time_phases:
+            for name in TIMED_METHODS:
+                solver.__dict__.pop(name, None)
+        if self.reporter is not None:
+            self.reporter(self.snapshot())
+
+    def poll(self):
+        # Called by the solver every 256 expanded nodes
+        if self.reporter is not None:
+            now = time.perf_counter()
+            if now >= self.next_report:
+                self.next_report = now + self.interval
+                self.reporter(self.snapshot())
+
+    def phase(self, name):
+        return _Phase(self, name)
+
+    def timed(self, name, method):
+        # Wrap a bound method so one call in sample_every is timed
+        perf_counter = time.perf_counter
+        sample_every = self.sample_every
+        phase_times = self.phase_times
+        calls = [0]
+
+        def wrapper(*args):
+            calls[0] += 1
+            if calls[0] % sample_every:
+                return method(*args)
+            start = perf_counter()
+            result = method(*args)
+            phase_times[name] += (perf_counter() - start) * sample_every
+            return result
+
+        return wrapper
+
+    def snapshot(self):
+        elapsed = time.perf_counter() - self.started if self.started is not None else 0.0
+        return {
+            'elapsed': elapsed,
+            'expansions': self.expansions,
+            'duplicates': self.duplicates,
+            'nodes_per_sec': self.expansions / elapsed if elapsed else 0.0,
+            'branching_factor': self.branching_factor(),
+            'depth': self.depth,
+            'max_depth': max(self.depth_histogram, default=0),
+            'progress': self.solver.progress if self.solver is not None else 0,
+            'depth_histogram': dict(sorted(self.depth_histogram.items())),
+            'phase_times': dict(self.phase_times),
+        }
+
+
+class _Phase:
+    def __init__(self, monitor, name):
+        self.monitor = monitor
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.monitor.phase_times[self.name] += time.perf_counter() - self.start
+        return False
+
+
+def print_progress(snapshot, file=None):
+    # Reporter printing one progress line per call (stderr by default)
+    print(f"{snapshot['elapsed']:7.1f}s  {snapshot['expansions']:10} nodes  "
+          f"{snapshot['nodes_per_sec']:8.0f}/s  {snapshot['duplicates']:10} duplicates  "
+          f"branching {snapshot['branching_factor']:.2f}  depth {snapshot['max_depth']}",
+          file=file or sys.stderr)
@@ -0,0 +1,120 @@
+from freecell_cards import pack_state, unpack_state
+from freecell_solver import FreeCellSolver, decode_move, encode_move, expand_solution
+
+# Solution post-processing. A solution from solve() is expanded into
+# single-card moves (the steps the GUI plays), then shortened in two passes:
+#   loops:     whenever the path comes back to a state it has already been
+#              in, the moves in between are cut out
+#   shortcuts: a breadth-first search of up to `depth` moves from each state
+#              on the path looks for a later state on the path that it can
+#              reach in fewer moves, and splices that shortcut in
+# States are compared by Zobrist key, so a state reached again with its
+# columns or free cells in a different order still counts; the moves after a
+# splice are remapped onto the actual layout when the path is replayed.
+
+
+def trace(solver, steps):
+    # (key, packed layout) of every state along steps, start and end included
+    tableau = [list(col) for col in solver.initial_tableau]
+    free_cells = list(solver.initial_free_cells)
+    solver.foundations = list(solver.initial_foundations)
+    solver.key = solver.hash_state(tableau, free_cells, solver.foundations)
+    states = [(solver.key, pack_state(tableau, free_cells, solver.foundations))]
+    for step in steps:
+        solver.make_move(step, tableau, free_cells)
+        states.append((solver.key, pack_state(tableau, free_cells, solver.foundations)))
+    return states
+
+
+def remove_loops(solver, steps, states):
+    # Jump from each state straight to its last occurrence on the path
+    last = {key: i for i, (key, _) in enumerate(states)}
+    kept = []
+    i = 0
+    while i < len(steps):
+        i = last[states[i][0]]
+        if i < len(steps):
+            kept.append((steps[i], states[i][1]))
+            i += 1
+    steps = solver.replay(kept)
+    return steps, trace(solver, steps)
+
+
+def find_shortcut(solver, states, start, depth, max_nodes):
+    # Breadth-first search of up to depth moves from states[start]. Returns
+    # (end index, [(move, packed layout)]) for the shortcut to a later path
+    # state that saves the most moves, or None if none saves any.
+    targets = {key: i for i, (key, _) in enumerate(states)}
+    key, packed = states[start]
+    parents = {key: None}
+    frontier = [(key, packed)]
+    best = None
+    for distance in range(1, depth + 1):
+        next_frontier = []
+        for key, packed in frontier:
+            tableau, free_cells, solver.foundations = unpack_state(packed)
+            solver.key = key
+            for move in solver.valid_moves(tableau, free_cells):
+                solver.make_move(move, tableau, free_cells)
+                child = solver.key
+                if child not in parents:
+                    parents[child] = (key, move, packed)
+                    end = targets.get(child)
+                    if end is not None and end - start - distance > (best[0] - start - best[1] if best else 0):
+                        best = (end, distance, child)
+                    next_frontier.append((child, pack_state(tableau, free_cells, solver.foundations)))
+                solver.unmake_move(move, tableau, free_cells)
+        frontier = next_frontier
+        if len(parents) > max_nodes:
+            break
+    if best is None:
+        return None
+    end, _, key = best
+    path = []
+    while parents[key] is not None:
+        key, move, packed = parents[key]
+        path.append((move, packed))
+    path.reverse()
+    return end, path
+
+
+def splice_shortcuts(solver, steps, states, depth, max_nodes):
+    shortcuts = 0
+    start = 0
+    while start < len(steps):
+        shortcut = find_shortcut(solver, states, start, depth, max_nodes)
+        if shortcut is None:
+            start += 1
+            continue
+        end, path = shortcut
+        kept = [(steps[i], states[i][1]) for i in range(start)] + path
+        kept += [(steps[i], states[i][1]) for i in range(end, len(steps))]
+        steps = solver.replay(kept)
+        states = trace(solver, steps)
+        shortcuts += 1
+    return steps, states, shortcuts
+
+
+def optimize_solution(tableau, free_cells, foundations, moves, depth=2, max_nodes=5000):
+    # Shorten a solution (string cards, as returned by solve) for the given
+    # position. Returns the optimized single-card moves and a report of the
+    # reduction. depth and max_nodes bound each shortcut search.
+    solver = FreeCellSolver(tableau, free_cells, foundations, supermoves=False, auto_foundation=False, rules=())
+    steps = [encode_move(move) for move in expand_solution(tableau, free_cells, foundations, moves)]
+    states = trace(solver, steps)
+    if not solver.is_solved():
+        raise ValueError("The moves do not solve the position")
+    expanded = len(steps)
+    steps, states = remove_loops(solver, steps, states)
+    without_loops = len(steps)
+    steps, states, shortcuts = splice_shortcuts(solver, steps, states, depth, max_nodes)
+    report = {
+        'moves': len(moves),
+        'steps': expanded,
+        'loops_removed': expanded - without_loops,
+        'shortcuts': shortcuts,
+        'shortcut_saved': without_loops - len(steps),
+        'final_steps': len(steps),
+        'reduction': 1 - len(steps) / expanded if expanded else 0.0,
+    }
+    return [decode_move(step) for step in steps], report
@@ -0,0 +1,262 @@
+import argparse
+import json
+import multiprocessing
+import os
+import queue
+import time
+from freecell_batch import read_deals
+from freecell_cards import decode_position
+from freecell_deals import deal_position
+from freecell_solver import FreeCellSolver, decode_move
+
+# Parallel search of a single deal.
+#
+# portfolio: race several solver configurations, one per process, and keep
+#            the first solution.
+# split:     expand the root until there are enough subtrees, deal them out
+#            to worker processes and search each one, deduplicating through
+#            a visited-state table shared by all workers.
+# Either way the first worker to find a solution sets a shared stop event,
+# which the others poll through FreeCellSolver.solve(cancel=...).
+#
+# A config holds solve() arguments plus FreeCellSolver keyword arguments
+# under 'options', as in freecell_bench.CONFIGS.
+
+DEFAULT_PORTFOLIO = [
+    {'strategy': 'weighted', 'weight': 5.0},
+    {'strategy': 'weighted', 'weight': 2.0},
+    {'strategy': 'weighted', 'heuristic': 'buried_low_cards', 'weight': 3.0},
+    {'strategy': 'dfs', 'options': {'max_depth': None}},
+]
+
+
+class SharedVisitedFilter:
+    # Exact local set in front of a lossy table of Zobrist keys shared
+    # between processes. Each key has one slot, so a newer key can evict an
+    # older one and the table only gives false negatives; that costs some
+    # duplicate work but never hides an unexplored state. Empty slots hold 0,
+    # which is also the key of the solved position, so 0 never matches.
+    def __init__(self, table, local=None):
+        self.local = set() if local is None else local
+        self.table = table
+        self.size = len(table)
+
+    def __contains__(self, key):
+        return key in self.local or (key != 0 and self.table[key % self.size] == key)
+
+    def add(self, key):
+        self.local.add(key)
+        self.table[key % self.size] = key
+
+    def __len__(self):
+        return len(self.local)
+
+
+def _solver(position, config):
+    return FreeCellSolver(*position, **config.get('options', {}))
+
+
+def _run(solver, config, time_limit, stop):
+    return solver.solve(config.get('strategy', 'dfs'), config.get('heuristic'), config.get('weight'),
+                        time_limit=time_limit, cancel=stop)
+
+
+def _portfolio_worker(worker_id, position, config, time_limit, stop, results):
+    nodes = 0
+    try:
+        solver = _solver(position, config)
+        moves = _run(solver, config, time_limit, stop)
+        nodes = solver.nodes_expanded
+        results.put((worker_id, solver.status, moves, nodes))
+    except Exception as error:
+        results.put((worker_id, f'error: {error}', None, nodes))
+
+
+def _split_worker(worker_id, subtrees, config, time_limit, table, stop, results):
+    # Search the assigned subtrees one after another within the shared deadline
+    deadline = None if time_limit is None else time.monotonic() + time_limit
+    nodes = 0
+    status = 'unsolved'
+    try:
+        for prefix, position in subtrees:
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                status = 'timeout'
+                break
+            solver = _solver(position, config)
+            solver.visited_factory = lambda memory_limit: SharedVisitedFilter(table)
+            solver.shared_visited = True
+            moves = _run(solver, config, remaining, stop)
+            nodes += solver.nodes_expanded
+            if moves is not None:
+                results.put((worker_id, 'solved', prefix + moves, nodes))
+                return
+            if solver.status == 'depth_limit':
+                status = 'depth_limit'  # Not a complete search, but the other subtrees may still solve
+            elif solver.status != 'unsolved':
+                status = solver.status
+                break
+        results.put((worker_id, status, None, nodes))
+    except Exception as error:
+        results.put((worker_id, f'error: {error}', None, nodes))
+
+
+def _collect(processes, results, stop):
+    # Wait for every worker to report; the first solution stops the rest
+    winner = None
+    statuses = {}
+    nodes = 0
+    remaining = len(processes)
+    while remaining:
+        try:
+            worker_id, status, moves, worker_nodes = results.get(timeout=0.1)
+        except queue.Empty:
+            if not any(process.is_alive() for process in processes) and results.empty():
+                break  # A worker died without reporting
+            continue
+        remaining -= 1
+        nodes += worker_nodes
+        statuses[worker_id] = status
+        if status == 'solved' and winner is None:
+            winner = (worker_id, moves)
+            stop.set()
+    for process in processes:
+        process.join()
+    return winner, statuses, nodes
+
+
+def split_root(tableau, free_cells, foundations, parts):
+    # Expand the root breadth-first until there are at least `parts` open
+    # subtrees (or the frontier stops growing). Returns (prefix moves,
+    # position) pairs, or just the solved one if the expansion solves the deal.
+    frontier = [([], (tableau, free_cells, foundations))]
+    for _ in range(4):
+        if len(frontier) >= parts:
+            break
+        expanded = []
+        for prefix, position in frontier:
+            solver = FreeCellSolver(*position)
+            if solver.is_solved():
+                return [(prefix, position)]
+            work_tableau = [list(col) for col in solver.initial_tableau]
+            work_free_cells = list(solver.initial_free_cells)
+            solver.key = solver.hash_state(work_tableau, work_free_cells, solver.foundations)
+            for move in solver.order_moves(solver.valid_moves(work_tableau, work_free_cells), work_tableau, None):
+                solver.make_move(move, work_tableau, work_free_cells)
+                child = decode_position(work_tableau, work_free_cells, solver.foundations)
+                expanded.append((prefix + [decode_move(move)], child))
+                solver.unmake_move(move, work_tableau, work_free_cells)
+        if not expanded:
+            break
+        frontier = expanded
+    return frontier
+
+
+def solve_portfolio(tableau, free_cells, foundations, configs=None, time_limit=None):
+    configs = configs or DEFAULT_PORTFOLIO
+    start = time.perf_counter()
+    context = multiprocessing.get_context()
+    stop = context.Event()
+    results = context.Queue()
+    position = (tableau, free_cells, foundations)
+    processes = [context.Process(target=_portfolio_worker, args=(i, position, config, time_limit, stop, results),
+                                 daemon=True)
+                 for i, config in enumerate(configs)]
+    for process in processes:
+        process.start()
+    winner, statuses, nodes = _collect(processes, results, stop)
+    return {
+        'mode': 'portfolio',
+        'status': 'solved' if winner else _overall_status(statuses),
+        'moves': winner[1] if winner else None,
+        'winner': configs[winner[0]] if winner else None,
+        'workers': len(processes),
+        'nodes': nodes,
+        'wall_time': time.perf_counter() - start,
+    }
+
+
+def solve_split(tableau, free_cells, foundations, workers=None, config=None, time_limit=None, table_size=1 << 20):
+    config = config or DEFAULT_PORTFOLIO[0]
+    workers = workers or os.cpu_count() or 1
+    start = time.perf_counter()
+    subtrees = split_root(tableau, free_cells, foundations, workers)
+    if len(subtrees) == 1 and FreeCellSolver(*subtrees[0][1]).is_solved():
+        return {'mode': 'split', 'status': 'solved', 'moves': subtrees[0][0], 'workers': 0,
+                'nodes': 0, 'wall_time': time.perf_counter() - start}
+
+    context = multiprocessing.get_context()
+    stop = context.Event()
+    results = context.Queue()
+    table = context.RawArray('Q', table_size)
+    # Round-robin keeps the most promising (first ranked) subtrees spread over the workers
+    assignments = [subtrees[i::workers] for i in range(min(workers, len(subtrees)))]
+    processes = [context.Process(target=_split_worker, args=(i, assigned, config, time_limit, table, stop, results),
+                                 daemon=True)
+                 for i, assigned in enumerate(assignments)]
+    for process in processes:
+        process.start()
+    winner, statuses, nodes = _collect(processes, results, stop)
+    return {
+        'mode': 'split',
+        'status': 'solved' if winner else _overall_status(statuses),
+        'moves': winner[1] if winner else None,
+        'workers': len(processes),
+        'subtrees': len(subtrees),
+        'nodes': nodes,
+        'wall_time': time.perf_counter() - start,
+    }
+
+
+def _overall_status(statuses):
+    # Without a winner the deal is only unsolved if every worker finished its search
+    for status in ('timeout', 'cancelled', 'depth_limit'):
+        if status in statuses.values():
+            return status
+    if all(status == 'unsolved' for status in statuses.values()):
+        return 'unsolved'
+    return 'error'
+
+
+def solve_parallel(tableau, free_cells, foundations, mode="portfolio", workers=None, time_limit=None, **kwargs):
+    if mode == "portfolio":
+        configs = kwargs.get('configs') or DEFAULT_PORTFOLIO
+        return solve_portfolio(tableau, free_cells, foundations, configs[:workers] if workers else configs, time_limit)
+    if mode == "split":
+        return solve_split(tableau, free_cells, foundations, workers, kwargs.get('config'), time_limit,
+                           kwargs.get('table_size', 1 << 20))
+    raise ValueError(f"Unknown parallel mode: {mode!r}")
+
+
+def measure_speedup(tableau, free_cells, foundations, mode="portfolio", workers=None, time_limit=None, **kwargs):
+    # Solve once with a single worker and once with `workers`, and report the wall-time ratio
+    single = solve_parallel(tableau, free_cells, foundations, mode, 1, time_limit, **kwargs)
+    parallel = solve_parallel(tableau, free_cells, foundations, mode, workers, time_limit, **kwargs)
+    return {
+        'single': single,
+        'parallel': parallel,
+        'speedup': single['wall_time'] / parallel['wall_time'] if parallel['wall_time'] else None,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Solve one FreeCell deal on several cores")
+    parser.add_argument("deal", help="JSON lines deals file (the first deal is solved)")
+    parser.add_argument("-m", "--mode", choices=["portfolio", "split"], default="portfolio")
+    parser.add_argument("-j", "--workers", type=int, default=None)
+    parser.add_argument("-t", "--timeout", type=float, default=None, help="time limit in seconds")
+    parser.add_argument("--speedup", action="store_true", help="also solve with one worker and report the speedup")
+    args = parser.parse_args(argv)
+
+    with open(args.deal) as deals_file:
+        deal = next(read_deals(deals_file))
+    position = deal_position(deal)
+    if args.speedup:
+        result = measure_speedup(*position, args.mode, args.workers, args.timeout)
+    else:
+        result = solve_parallel(*position, args.mode, args.workers, args.timeout)
+    print(json.dumps(result))
+
+
+if __name__ == "__main__":
+    main()
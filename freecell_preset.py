@@ -1,7 +1,8 @@
 import tkinter as tk
-from tkinter import messagebox
-import copy
-from freecell_solver import FreeCellSolver  # Import the solver from another file
+from freecell_board import CardBoard
+from freecell_cache import SolutionCache  # Solves through the solver in freecell_solver
+from freecell_solver import format_move, play_move
+from freecell_worker import SolveController
 
 # Define card suits and values
 suits = ['Hearts', 'Diamonds', 'Clubs', 'Spades']
@@ -20,16 +21,18 @@ class FreeCellGUI:
         self.tableau = self.create_custom_tableau()  # Use a custom tableau configuration
         self.free_cells = [None for _ in range(4)]
         self.foundations = [[] for _ in range(4)]  # Four foundation piles
-        self.card_widgets = {}
-        self.selected_card = None
+        self.selected_card = None  # Name of the card being dragged
         self.selected_pile = None
+        self.cache = SolutionCache()  # Solve results persist across Reset and across runs
 
         # Create UI components
         self.create_widgets()
+        self.controller = SolveController(self.root, self.cache, self.solve_button, self.cancel_button,
+                                          self.status_label, self.play_step, self.report_solution)
+        self.root.protocol("WM_DELETE_WINDOW", self.close)
         
     def create_custom_tableau(self):
         # Define the custom tableau configuration based on your screenshot
-        print("Creating custom tableau...")
         return [
             ['5 of Diamonds', 'Q of Hearts', '7 of Spades', '7 of Clubs', '2 of Clubs', '5 of Hearts', '10 of Spades'],
             ['4 of Spades', 'A of Hearts', '4 of Hearts', '8 of Diamonds', '8 of Clubs', '8 of Spades', '10 of Hearts'],
@@ -42,7 +45,6 @@ class FreeCellGUI:
         ]
 
     def create_widgets(self):
-        print("Creating widgets...")
         # Create free cells
         self.free_cell_frames = []
         for i in range(4):
@@ -69,36 +71,59 @@ class FreeCellGUI:
         self.reset_button = tk.Button(self.root, text="Reset", command=self.reset_game)
         self.reset_button.grid(row=3, column=0, columnspan=8, pady=10)
 
+        self.cancel_button = tk.Button(self.root, text="Cancel", command=self.cancel_solve, state="disabled")
+        self.cancel_button.grid(row=4, column=0, columnspan=8, pady=10)
+
+        self.status_label = tk.Label(self.root, text="")
+        self.status_label.grid(row=5, column=0, columnspan=8, pady=5)
+
+        # One label per card, reused for the whole session
+        self.board = CardBoard(self.root, [card for suit in suits for card in self.deck_by_suit[suit]],
+                               on_press=self.start_drag)
+        for i, frame in enumerate(self.tableau_frames):
+            self.board.add_pile(('tableau', i), frame, anchor="w", padx=2, pady=2)
+        for i, frame in enumerate(self.free_cell_frames):
+            self.board.add_pile(('free', i), frame)
+        for i, frame in enumerate(self.foundation_frames):
+            self.board.add_pile(('foundation', i), frame, anchor="w", padx=2, pady=2)
+
         # Display the initial tableau
         self.display_tableau()
 
+    def piles(self):
+        # The model as board piles
+        piles = {('tableau', i): col for i, col in enumerate(self.tableau)}
+        piles.update({('free', i): [card] for i, card in enumerate(self.free_cells)})
+        piles.update({('foundation', i): pile for i, pile in enumerate(self.foundations)})
+        return piles
+
     def display_tableau(self):
-        print("Displaying the tableau...")
-        for i, col in enumerate(self.tableau):
-            for card in col:
-                label = tk.Label(self.tableau_frames[i], text=card)
-                label.pack(anchor="w", padx=2, pady=2)
-                label.bind("<Button-1>", lambda event, l=label, c=i: self.start_drag(event, l, c))
-                self.card_widgets[label] = (i, card)
-
-    def start_drag(self, event, label, col):
-        self.selected_card = label
-        self.selected_pile = col
-        label.config(bg="yellow")
-        print(f"Selected card: {label.cget('text')} from column {col}")
+        # Bring the board in line with the model; only changed piles are touched
+        self.board.update(self.piles())
+
+    def start_drag(self, event, card):
+        if self.controller.busy():
+            return  # The model must not change under a solve or its playback
+        pile = self.board.pile_of(card)
+        if pile is None or pile[0] == 'foundation':
+            return
+        self.selected_card = card
+        self.selected_pile = pile
+        self.board.highlight(card, "yellow")
         self.root.bind("<B1-Motion>", self.drag_card)
         self.root.bind("<ButtonRelease-1>", self.drop_card)
 
     def drag_card(self, event):
         if self.selected_card:
-            self.selected_card.place(x=event.x_root - self.root.winfo_rootx(), y=event.y_root - self.root.winfo_rooty())
+            self.board.lift(self.selected_card, event.x_root - self.root.winfo_rootx(),
+                            event.y_root - self.root.winfo_rooty())
 
     def drop_card(self, event):
         if self.selected_card:
+            card = self.selected_card
             dropped = False
             for i, frame in enumerate(self.tableau_frames):
                 if frame.winfo_rootx() < event.x_root < frame.winfo_rootx() + frame.winfo_width():
-                    print(f"Dropping card in tableau column {i}")
                     self.place_card_in_tableau(i)
                     dropped = True
                     break
@@ -106,7 +131,6 @@ class FreeCellGUI:
             if not dropped:
                 for i, frame in enumerate(self.free_cell_frames):
                     if frame.winfo_rootx() < event.x_root < frame.winfo_rootx() + frame.winfo_width():
-                        print(f"Dropping card in free cell {i}")
                         self.place_card_in_free_cell(None, i)
                         dropped = True
                         break
@@ -114,95 +138,81 @@ class FreeCellGUI:
             if not dropped:
                 for i, frame in enumerate(self.foundation_frames):
                     if frame.winfo_rootx() < event.x_root < frame.winfo_rootx() + frame.winfo_width():
-                        print(f"Dropping card in foundation pile {i}")
                         self.place_card_in_foundation(i)
                         dropped = True
                         break
 
-            if not dropped:
-                print("Invalid drop location, returning card to original position")
-                self.selected_card.place_forget()
-                self.selected_card.pack()
-
-            self.selected_card.config(bg="white")
+            # Back into its pile, old or new
+            self.board.drop(card)
+            self.board.highlight(card, "white")
+            self.display_tableau()
             self.selected_card = None
             self.selected_pile = None
 
         self.root.unbind("<B1-Motion>")
         self.root.unbind("<ButtonRelease-1>")
 
+    def take_selected_card(self):
+        # Remove the selected card from the pile it was dragged from
+        kind, index = self.selected_pile
+        if kind == 'tableau':
+            self.tableau[index].remove(self.selected_card)
+        else:
+            self.free_cells[index] = None
+        return self.selected_card
+
     def place_card_in_tableau(self, col):
-        if self.selected_card:
-            old_col, card = self.card_widgets[self.selected_card]
-            print(f"Moving card {card} from column {old_col} to column {col}")
-            self.tableau[col].append(card)
-            self.tableau[old_col].remove(card)
-            self.selected_card.pack_forget()
-            label = tk.Label(self.tableau_frames[col], text=card)
-            label.pack(anchor="w", padx=2, pady=2)
-            label.bind("<Button-1>", lambda event, l=label, c=col: self.start_drag(event, l, c))
-            self.card_widgets[label] = (col, card)
+        if self.selected_card and self.selected_pile != ('tableau', col):
+            self.tableau[col].append(self.take_selected_card())
 
     def place_card_in_free_cell(self, event, cell):
         if self.selected_card and self.free_cells[cell] is None:
-            old_col, card = self.card_widgets[self.selected_card]
-            print(f"Placing card {card} in free cell {cell}")
-            self.free_cells[cell] = card
-            self.tableau[old_col].remove(card)
-            self.selected_card.pack_forget()
-            label = tk.Label(self.free_cell_frames[cell], text=card)
-            label.pack()
-            label.bind("<Button-1>", lambda event, l=label, c=cell: self.select_free_cell_card(event, l, c))
-            self.card_widgets[label] = (cell, card)
-            self.selected_card = None
+            self.free_cells[cell] = self.take_selected_card()
 
     def place_card_in_foundation(self, foundation_index):
         if self.selected_card:
-            old_col, card = self.card_widgets[self.selected_card]
+            card = self.selected_card
             suit = card.split(' of ')[1]
             foundation_suit = suits[foundation_index]
             if suit == foundation_suit and (not self.foundations[foundation_index] or
                 values.index(self.foundations[foundation_index][-1].split(' of ')[0]) + 1 == values.index(card.split(' of ')[0])):
-                print(f"Placing card {card} in foundation pile {foundation_index}")
-                self.foundations[foundation_index].append(card)
-                self.tableau[old_col].remove(card)
-                self.selected_card.pack_forget()
-                label = tk.Label(self.foundation_frames[foundation_index], text=card)
-                label.pack(anchor="w", padx=2, pady=2)
-                self.card_widgets.pop(self.selected_card, None)
-                self.selected_card = None
+                self.foundations[foundation_index].append(self.take_selected_card())
             else:
                 print("Invalid move to foundation")
 
     def solve_game(self):
-        print("Solving the game...")
-        solver = FreeCellSolver(self.tableau, self.free_cells, self.foundations)
-        solution = solver.solve()
-
-        if solution:
-            steps = [f"Move card '{move[2]}' from {move[1]} to {move[3]}" for move in solution]
-            messagebox.showinfo("Solution", "\n".join(steps))
-            print("Solution found:")
-            for step in steps:
-                print(step)
-        else:
+        if self.controller.worker is None:
+            print("Solving the game...")
+        self.controller.solve(self.tableau, self.free_cells, self.foundations)
+
+    def report_solution(self, status, moves, hit, report):
+        if moves is None:
             print("No solution found")
-            messagebox.showinfo("Solution", "No solution found")
+            return
+        print(f"Solution found{' (cached)' if hit else ''}: {report['final_steps']} steps, "
+              f"shortened from {report['steps']}")
+        for move in moves:
+            print(format_move(move))
+
+    def play_step(self, move):
+        play_move(self.tableau, self.free_cells, self.foundations, move)
+        self.display_tableau()
+
+    def cancel_solve(self):
+        self.controller.cancel()
+
+    def close(self):
+        # Flush the cache's last_used times before quitting
+        self.controller.close()
+        self.cache.close()
+        self.root.destroy()
 
     def reset_game(self):
         print("Resetting the game...")
+        self.controller.reset()
         self.tableau = self.create_custom_tableau()
         self.free_cells = [None for _ in range(4)]
         self.foundations = [[] for _ in range(4)]
-        for frame in self.tableau_frames:
-            for widget in frame.winfo_children():
-                widget.destroy()
-        for frame in self.free_cell_frames:
-            for widget in frame.winfo_children():
-                widget.destroy()
-        for frame in self.foundation_frames:
-            for widget in frame.winfo_children():
-                widget.destroy()
         self.display_tableau()
 
 if __name__ == "__main__":
@@ -1,72 +1,841 @@
-import copy
+import functools
+import heapq
+import itertools
+import math
+import time
+from freecell_cards import (suits, values, can_stack, card_from_str, card_to_str, encode_position, make_card,
+                            pack_state, unpack_state, zobrist_key, ZOBRIST, FREE_CELL)
+from freecell_heuristics import get_heuristic
+from freecell_visited import make_visited, MemoryLimitExceeded, EXACT_BYTES_PER_KEY
+
+# Search strategies accepted by FreeCellSolver.solve, with their default
+# heuristic and weight. Best-first strategies order the frontier by
+# g + weight * h, so bfs (weight 0) is breadth-first, astar is plain A* and
+# weighted trades solution length for speed. The iterative-deepening
+# strategies run depth-first passes bounded by the same g + weight * h,
+# raising the bound after each pass: iddfs bounds depth alone, idastar is IDA*.
+STRATEGIES = {
+    'dfs': (None, None),
+    'bfs': ('zero', 0.0),
+    'astar': ('cards_left', 1.0),
+    'weighted': ('combined', 2.0),
+    'iddfs': ('zero', 1.0),
+    'idastar': ('cards_left', 1.0),
+}
+ITERATIVE_STRATEGIES = ('iddfs', 'idastar')
+BEST_FIRST_STRATEGIES = ('bfs', 'astar', 'weighted')
+
+TABLE_BYTES_PER_ENTRY = 160  # Dict slot, int key and the entry tuple, roughly
+# Best-first bookkeeping per generated state: its parents and best_g
+# entries, its frontier tuple with the packed layout and its key in an
+# exact visited set, as measured with tracemalloc (about 560), rounded up
+BEST_FIRST_BYTES_PER_STATE = 600
+# Share of memory_limit for the dead-end proofs' memo (see FreeCellSolver.split_memory)
+DEAD_END_SHARE = 0.125
+DEAD_END_NODES = 200  # States a dead-end proof may visit before giving up
+FREE_CELL_NAMES = 'abcd'  # Free cells in standard move notation
+
+
+# Move tuples, with pile indices into the tableau (col) and free cells (cell):
+#   ('T->F', col, cell, card)        ('F->T', cell, col, card)
+#   ('T->T', col, col, card)         ('T->T*', col, col, card, count)
+#   ('T->Fnd', col, card)            ('F->Fnd', cell, card)
+#   ('Auto', steps)
+# 'T->T*' is a supermove of `count` cards whose bottom card is `card`, and
+# 'Auto' is a compound step of safe foundation moves ('T->Fnd'/'F->Fnd').
+# expand_solution turns both back into single-card moves.
+
+def convert_move(move, convert):
+    # Apply `convert` to the card(s) of a move, e.g. to switch encodings
+    move_type = move[0]
+    if move_type == 'Auto':
+        return (move_type, tuple(convert_move(step, convert) for step in move[1]))
+    if move_type == 'T->T*':
+        return move[:3] + (convert(move[3]), move[4])
+    return move[:-1] + (convert(move[-1]),)
+
+
+# Move pruning and ordering rules applied by FreeCellSolver.order_moves, and
+# dead-end pruning applied by the searches. Each can be toggled through the
+# `rules` constructor argument, and the number of moves each rule pruned (or
+# move lists it ranked, or states it proved dead) is counted in solver.stats.
+#   dedupe_empty_targets: all empty columns are equivalent, only target the first
+#   lone_to_empty:        never move a whole column into an empty column
+#   no_reversal:          never undo the previous move straight away
+#   rank_moves:           try foundation moves first, then moves that uncover low cards
+#                         (depth-first searches only; best-first follows its heap)
+#   dead_ends:            skip states proved unsolvable by FreeCellSolver.is_dead
+PRUNING_RULES = ('dedupe_empty_targets', 'lone_to_empty', 'no_reversal', 'rank_moves', 'dead_ends')
+# dead_ends is off by default: it cuts a few percent of the nodes, but with
+# a visited set a dead region costs about as much to prove as to search, so
+# it breaks even on time. It pays where the same regions are searched again.
+DEFAULT_RULES = ('dedupe_empty_targets', 'lone_to_empty', 'no_reversal', 'rank_moves')
+
+
+class SearchAborted(Exception):
+    # Raised inside the search when its time limit passes or it is cancelled
+    pass
+
+
+def decode_move(move):
+    # Turn a move with int-encoded cards back into the string form the GUI shows
+    return convert_move(move, card_to_str)
+
+
+def encode_move(move):
+    return convert_move(move, card_from_str)
+
+
+def match_layout(from_tableau, from_free_cells, to_tableau, to_free_cells):
+    # Map the column and free-cell indices of one layout onto an equivalent
+    # layout (same canonical state) whose piles may be in a different order
+    def match(src, dest):
+        slots = {}
+        for j, item in enumerate(dest):
+            slots.setdefault(item, []).append(j)
+        return [slots[item].pop() for item in src]
+
+    col_map = match([tuple(col) for col in from_tableau], [tuple(col) for col in to_tableau])
+    cell_map = match(list(from_free_cells), list(to_free_cells))
+    return col_map, cell_map
+
+
+def remap_move(move, col_map, cell_map):
+    # Rewrite the pile indices of a move using maps from match_layout
+    move_type = move[0]
+    if move_type == 'T->F':
+        return (move_type, col_map[move[1]], cell_map[move[2]], move[3])
+    if move_type == 'F->T':
+        return (move_type, cell_map[move[1]], col_map[move[2]], move[3])
+    if move_type == 'T->T':
+        return (move_type, col_map[move[1]], col_map[move[2]], move[3])
+    if move_type == 'T->T*':
+        return (move_type, col_map[move[1]], col_map[move[2]], move[3], move[4])
+    if move_type == 'Auto':
+        return (move_type, tuple(remap_move(step, col_map, cell_map) for step in move[1]))
+    if move_type == 'T->Fnd':
+        return (move_type, col_map[move[1]], move[2])
+    if move_type == 'F->Fnd':
+        return (move_type, cell_map[move[1]], move[2])
+    raise ValueError(f"Unknown move type: {move_type!r}")
+
+
+def expand_solution(tableau, free_cells, foundations, moves):
+    # Replay a solution (string cards, as returned by solve) from the given
+    # position and expand supermoves and auto-move steps into single-card
+    # moves, e.g. for step-by-step playback in the GUI
+    solver = FreeCellSolver(tableau, free_cells, foundations)
+    tableau = [list(col) for col in solver.initial_tableau]
+    free_cells = list(solver.initial_free_cells)
+    steps = []
+    for move in moves:
+        move = encode_move(move)
+        if move[0] == 'Auto':
+            for step in move[1]:
+                solver.make_move(step, tableau, free_cells)
+                steps.append(step)
+        elif move[0] == 'T->T*':
+            solver.expand_supermove(move[1], move[2], move[4], tableau, free_cells, steps)
+        else:
+            solver.make_move(move, tableau, free_cells)
+            steps.append(move)
+    return [decode_move(step) for step in steps]
+
+
+def format_move(move):
+    # Human readable description of a (string card) move
+    move_type = move[0]
+    if move_type == 'Auto':
+        return "; ".join(format_move(step) for step in move[1])
+    if move_type == 'T->F':
+        return f"Move {move[3]} from column {move[1] + 1} to free cell {move[2] + 1}"
+    if move_type == 'F->T':
+        return f"Move {move[3]} from free cell {move[1] + 1} to column {move[2] + 1}"
+    if move_type == 'T->T':
+        return f"Move {move[3]} from column {move[1] + 1} to column {move[2] + 1}"
+    if move_type == 'T->T*':
+        return f"Move {move[4]} cards from {move[3]} up from column {move[1] + 1} to column {move[2] + 1}"
+    if move_type == 'T->Fnd':
+        return f"Move {move[2]} from column {move[1] + 1} to the foundation"
+    if move_type == 'F->Fnd':
+        return f"Move {move[2]} from free cell {move[1] + 1} to the foundation"
+    raise ValueError(f"Unknown move type: {move_type!r}")
+
+
+def move_notation(move):
+    # Standard FreeCell notation of a move: source then destination, with
+    # columns 1-8, free cells a-d and the foundation h. A supermove is
+    # written like a single-card move; an 'Auto' step is its moves in turn.
+    move_type = move[0]
+    if move_type == 'Auto':
+        return " ".join(move_notation(step) for step in move[1])
+    if move_type == 'T->F':
+        return f"{move[1] + 1}{FREE_CELL_NAMES[move[2]]}"
+    if move_type == 'F->T':
+        return f"{FREE_CELL_NAMES[move[1]]}{move[2] + 1}"
+    if move_type in ('T->T', 'T->T*'):
+        return f"{move[1] + 1}{move[2] + 1}"
+    if move_type == 'T->Fnd':
+        return f"{move[1] + 1}h"
+    if move_type == 'F->Fnd':
+        return f"{FREE_CELL_NAMES[move[1]]}h"
+    raise ValueError(f"Unknown move type: {move_type!r}")
+
+
+def play_move(tableau, free_cells, foundations, move):
+    # Apply a single-card move (string cards) to a position in the GUI's form:
+    # free cells hold None when empty and foundations are per-suit card lists
+    move_type = move[0]
+    if move_type == 'T->F':
+        free_cells[move[2]] = tableau[move[1]].pop()
+    elif move_type == 'F->T':
+        tableau[move[2]].append(free_cells[move[1]])
+        free_cells[move[1]] = None
+    elif move_type == 'T->T':
+        tableau[move[2]].append(tableau[move[1]].pop())
+    elif move_type == 'T->Fnd':
+        card = tableau[move[1]].pop()
+        foundations[suits.index(card.split(' of ')[1])].append(card)
+    elif move_type == 'F->Fnd':
+        card = free_cells[move[1]]
+        free_cells[move[1]] = None
+        foundations[suits.index(card.split(' of ')[1])].append(card)
+    else:
+        raise ValueError(f"Not a single-card move: {move_type!r}")
+
+
+def sequence_length(col):
+    # Number of cards at the top of a (non-empty) column that form an
+    # alternating-colour descending run and can move as one unit
+    length = 1
+    while length < len(col) and can_stack(col[-length], col[-length - 1]):
+        length += 1
+    return length
+
+
+def is_reversal(previous, move):
+    # True if move puts the card(s) previous just moved straight back
+    previous_type, move_type = previous[0], move[0]
+    if previous_type == 'T->F':
+        return move_type == 'F->T' and move[1] == previous[2] and move[2] == previous[1]
+    if previous_type == 'F->T':
+        return move_type == 'T->F' and move[1] == previous[2] and move[3] == previous[3]
+    if previous_type in ('T->T', 'T->T*'):
+        return move_type == previous_type and move[1] == previous[2] and move[2] == previous[1] and move[3] == previous[3]
+    return False
+
+
+def fills_board(move, tableau):
+    # True if move, just played, may have taken the last free cell or empty
+    # column: it went to a free cell, or its card is now at the bottom of a column
+    move_type = move[0]
+    if move_type == 'T->F':
+        return True
+    if move_type in ('T->T', 'T->T*'):
+        return any(col[0] == move[3] for col in tableau if col)
+    return False
+
+
+def is_safe_auto_move(card, foundations):
+    # A card can go home for good once nothing could still be stacked on it:
+    # aces and twos always, otherwise when both opposite-colour foundations
+    # already hold the next lower rank
+    rank = card >> 2
+    if rank <= 2:
+        return True
+    opposite = 0 if card & 2 else 2
+    return foundations[opposite] >= rank - 1 and foundations[opposite + 1] >= rank - 1
 
-# Define card suits and values
-suits = ['Hearts', 'Diamonds', 'Clubs', 'Spades']
-values = ['A', '2', '3', '4', '5', '6', '7', '8', '9', '10', 'J', 'Q', 'K']
 
 class FreeCellSolver:
-    def __init__(self, tableau, free_cells, foundations):
-        self.initial_tableau = copy.deepcopy(tableau)
-        self.initial_free_cells = copy.deepcopy(free_cells)
-        self.foundations = foundations
+    def __init__(self, tableau, free_cells, foundations, max_depth=None, supermoves=True, auto_foundation=True,
+                 rules=DEFAULT_RULES, visited="exact", memory_limit=None, fp_rate=0.001, monitor=None):
+        # Cards are int-encoded internally (see freecell_cards), foundations are per-suit heights
+        self.initial_tableau, self.initial_free_cells, self.initial_foundations = encode_position(
+            tableau, free_cells, foundations)
+        self.foundations = list(self.initial_foundations)
         self.moves = []
-        self.visited_states = set()  # Set to keep track of visited states
+        # Builds visited_states, the Zobrist keys of the states already
+        # searched, for each solve from its share of the memory limit (see
+        # freecell_visited for the backends and split_memory for the shares)
+        self.visited_factory = functools.partial(make_visited, visited, fp_rate=fp_rate)
+        self.visited_backend = visited
+        self.visited_states = None
+        # True when visited_states is shared with other searches (freecell_parallel sets it)
+        self.shared_visited = False
+        self.memory_limit = memory_limit
+        # Transposition table of the iterative-deepening strategies:
+        # key -> (pass number, shallowest depth reached in that pass, learned h).
+        # It is cleared whenever it outgrows its share of the memory limit.
+        self.table = {}
+        self.table_limit = None
+        # Most states the best-first strategies may generate within their share of the memory limit
+        self.state_limit = None
+        # Keys of states proved unsolvable. Whether a state is dead does not
+        # depend on the search, so this is kept across solves (and cleared
+        # when it outgrows its share of the memory limit).
+        self.dead_states = set()
+        # Keys of full-board states a dead-end proof failed on (see is_dead),
+        # kept and limited together with dead_states
+        self.live_states = set()
+        self.dead_limit = None
+        self.key = 0  # Canonical key of the working position, kept up to date by make_move
+        self.nodes_expanded = 0
+        # Depth cap of the depth-first strategies: they find solutions of at
+        # most max_depth moves and never expand a state that deep. None for no cap.
+        self.max_depth = max_depth
+        self.supermoves = supermoves  # Generate multi-card sequence moves
+        self.auto_foundation = auto_foundation  # Play safe foundation moves as one forced step
+        unknown = set(rules) - set(PRUNING_RULES)
+        if unknown:
+            raise ValueError(f"Unknown pruning rules: {sorted(unknown)}")
+        self.rules = frozenset(rules)
+        self.stats = dict.fromkeys(PRUNING_RULES, 0)
+        # 'solved', 'unsolved', 'depth_limit', 'timeout', 'node_limit', 'cancelled' or 'memory' after
+        # solve(). 'unsolved' means the search was complete; 'depth_limit' that it found nothing but
+        # max_depth cut some of it off (depth_cutoffs counts the states cut off).
+        self.status = None
+        self.depth_cutoffs = 0
+        # Best partial progress of the last solve: the moves to the state
+        # with the most cards on the foundations, and that number of cards
+        self.partial = []
+        self.progress = 0
+        self.partial_moves = []
+        self.deadline = None
+        self.node_limit = None
+        self.cancel = None
+        self.monitor = monitor  # Optional freecell_instrument.SearchMonitor; None keeps the search uninstrumented
 
-    def solve(self):
-        tableau = copy.deepcopy(self.initial_tableau)
-        free_cells = copy.deepcopy(self.initial_free_cells)
-        if self.dfs(tableau, free_cells, 0):
-            return self.moves
+    def solve(self, strategy="dfs", heuristic=None, weight=None, time_limit=None, cancel=None, node_limit=None):
+        # time_limit is in seconds, node_limit caps the expanded nodes and
+        # cancel is any object with an is_set() method (e.g. threading.Event).
+        # All three are polled every 256 nodes and make solve return None with
+        # status 'timeout' / 'node_limit' / 'cancelled'. Whenever solve returns
+        # None, self.partial holds the best partial progress found.
+        if strategy not in STRATEGIES:
+            raise ValueError(f"Unknown strategy: {strategy!r}")
+        self.deadline = None if time_limit is None else time.monotonic() + time_limit
+        self.node_limit = node_limit
+        self.cancel = cancel
+        # The search mutates one working copy of the position in place
+        tableau = [list(col) for col in self.initial_tableau]
+        free_cells = list(self.initial_free_cells)
+        self.foundations = list(self.initial_foundations)
+        self.moves = []
+        self.partial_moves = []
+        self.progress = sum(self.foundations)
+        visited_limit = self.split_memory(strategy)
+        if strategy in BEST_FIRST_STRATEGIES and self.visited_backend != "exact" and not self.shared_visited:
+            # best_g already deduplicates exactly, so a lossy backend would
+            # only take memory from it (or drop states on false positives)
+            self.visited_states = make_visited("exact", visited_limit)
+        else:
+            self.visited_states = self.visited_factory(visited_limit)
+        self.table = {}
+        self.allocate_frames()
+        self.nodes_expanded = 0
+        self.depth_cutoffs = 0
+        self.stats = dict.fromkeys(PRUNING_RULES, 0)
+        self.key = self.hash_state(tableau, free_cells, self.foundations)
+        monitor = self.monitor
+        if monitor is not None:
+            monitor.start(self)
+        try:
+            if strategy == "dfs":
+                search = functools.partial(self.dfs, tableau, free_cells)
+            else:
+                default_heuristic, default_weight = STRATEGIES[strategy]
+                heuristic = get_heuristic(heuristic or default_heuristic)
+                if monitor is not None and monitor.time_phases:
+                    heuristic = monitor.timed('heuristic', heuristic)
+                search = functools.partial(
+                    self.iterative_deepening if strategy in ITERATIVE_STRATEGIES else self.best_first,
+                    tableau, free_cells, heuristic, default_weight if weight is None else weight)
+            if self.hopeless(tableau, free_cells):
+                found = False
+            elif monitor is None:
+                found = search()
+            else:
+                with monitor.phase('search'):
+                    found = search()
+        except SearchAborted as aborted:
+            self.status = str(aborted)
+        except MemoryLimitExceeded:
+            self.status = 'memory'
+        else:
+            if found:
+                self.status = 'solved'
+            else:
+                self.status = 'depth_limit' if self.depth_cutoffs else 'unsolved'
+        finally:
+            if monitor is not None:
+                monitor.finish(self)
+        if self.status == 'solved':
+            self.partial = [decode_move(move) for move in self.moves]
+            self.progress = 52
+            return self.partial
+        self.partial = [decode_move(move) for move in self.partial_moves]
         return None
 
-    def dfs(self, tableau, free_cells, depth):
-        if self.is_solved():
-            print("Solution found!")
-            return True
+    def split_memory(self, strategy):
+        # Share memory_limit out between the search's own bookkeeping and
+        # visited_states, so that together they stay under it; returns the
+        # visited backend's share. The dead-end proofs get DEAD_END_SHARE
+        # when that rule is on. The iterative-deepening strategies keep their
+        # states in the transposition table and never use visited_states.
+        # Best-first search always keeps an exact visited set, whose keys its
+        # per-state bookkeeping already counts.
+        limit = self.memory_limit
+        if limit is None:
+            return None
+        if 'dead_ends' in self.rules:
+            self.dead_limit = max(1, int(limit * DEAD_END_SHARE) // EXACT_BYTES_PER_KEY)
+            limit -= int(limit * DEAD_END_SHARE)
+        if strategy in ITERATIVE_STRATEGIES:
+            self.table_limit = max(1, limit // TABLE_BYTES_PER_ENTRY)
+            return 0
+        if strategy == "dfs":
+            return limit
+        self.state_limit = max(1, limit // BEST_FIRST_BYTES_PER_STATE)
+        return limit
 
-        if depth > 100:  # Limit depth to avoid infinite recursion
-            print("Depth limit reached, returning to previous state.")
+    def check_limits(self):
+        # Called every 256 expanded nodes
+        if self.monitor is not None:
+            self.monitor.poll()
+        if self.cancel is not None and self.cancel.is_set():
+            raise SearchAborted('cancelled')
+        if self.deadline is not None and time.monotonic() > self.deadline:
+            raise SearchAborted('timeout')
+        if self.node_limit is not None and self.nodes_expanded >= self.node_limit:
+            raise SearchAborted('node_limit')
+
+    def note_progress(self):
+        # Remember the current path if it has the most cards home so far
+        progress = sum(self.foundations)
+        if progress > self.progress:
+            self.progress = progress
+            self.partial_moves = list(self.moves)
+
+    def hopeless(self, tableau, free_cells):
+        # Pre-check before searching: a position without every card exactly
+        # once (counting the foundations) can never be solved, and neither
+        # can a dead end. It fails fast on malformed positions and on full
+        # boards with no way out; an unsolvable complete deal is still only
+        # found out by searching it to the end.
+        cards = [card for col in tableau for card in col] + [card for card in free_cells if card]
+        expected = {make_card(rank, suit) for suit, height in enumerate(self.foundations)
+                   for rank in range(height + 1, len(values) + 1)}
+        if len(cards) != len(expected) or set(cards) != expected:
+            return True
+        if 'dead_ends' not in self.rules or 0 in free_cells or not all(tableau):
             return False
+        return self.is_dead(tableau, free_cells, self.valid_moves(tableau, free_cells))
 
-        state_hash = self.hash_state(tableau, free_cells, self.foundations)
-        if state_hash in self.visited_states:
-            print("State already visited, skipping...")
+    def is_dead(self, tableau, free_cells, moves, last_move=None):
+        # True if no solution can be reached from the working position, whose
+        # valid_moves are `moves`. Only attempted with every free cell and
+        # column occupied: then the only moves are single cards onto other
+        # columns or the foundations, so the states reachable from here are
+        # few. They are all visited; the position is dead if none of them is
+        # solved or opens up a free cell or an empty column (which would give
+        # the search room again), and the proof gives up after DEAD_END_NODES
+        # states. Every state visited is dead too, and all are remembered in
+        # dead_states. A proof that fails remembers its states in live_states
+        # instead, so the same region is never tried again. Past the root a
+        # proof is only started where last_move has just filled the board:
+        # any full position below that is in the region already tried.
+        if 0 in free_cells or not all(tableau):
+            return False
+        dead_states = self.dead_states
+        start = self.key
+        if start in dead_states:
+            self.stats['dead_ends'] += 1
+            return True
+        if start in self.live_states or (last_move is not None and not fills_board(last_move, tableau)):
+            return False
+        # Usually one of the moves frees a free cell or a column outright
+        for move in moves:
+            move_type = move[0]
+            if move_type == 'F->T' or move_type == 'F->Fnd' or (
+                    move_type != 'Auto' and len(tableau[move[1]]) == 1):
+                return False
+        foundations = self.foundations
+        closure = {start}
+        frontier = []
+        escaped = False
+        try:
+            while not escaped:
+                for move in moves:
+                    self.make_move(move, tableau, free_cells)
+                    child = self.key
+                    if child not in closure and child not in dead_states:
+                        escaped = (0 in free_cells or not all(tableau) or self.is_solved()
+                                   or len(closure) >= DEAD_END_NODES or child in self.live_states)
+                        if not escaped:
+                            closure.add(child)
+                            frontier.append((child, pack_state(tableau, free_cells, self.foundations)))
+                    self.unmake_move(move, tableau, free_cells)
+                    if escaped:
+                        break
+                if escaped or not frontier:
+                    break
+                # Later states are unpacked into fresh lists, leaving the working position alone
+                self.key, packed = frontier.pop()
+                tableau, free_cells, self.foundations = unpack_state(packed)
+                moves = self.full_board_moves(tableau, free_cells)
+        finally:
+            self.foundations = foundations
+            self.key = start
+        memo = self.live_states if escaped else dead_states
+        if self.dead_limit is not None and len(dead_states) + len(self.live_states) + len(closure) > self.dead_limit:
+            dead_states.clear()
+            self.live_states.clear()
+        memo.update(closure)
+        if escaped:
             return False
+        self.stats['dead_ends'] += 1
+        return True
+
+    def full_board_moves(self, tableau, free_cells):
+        # Every single-card move of a position with no free cell or column
+        # empty, for is_dead. Without auto moves these reach at least the
+        # states valid_moves would, which keeps the proofs sound.
+        foundations = self.foundations
+        moves = []
+        for i, card in enumerate(free_cells):
+            if foundations[card & 3] + 1 == card >> 2:
+                moves.append(('F->Fnd', i, card))
+            for j, col in enumerate(tableau):
+                if can_stack(card, col[-1]):
+                    moves.append(('F->T', i, j, card))
+        for i, col in enumerate(tableau):
+            card = col[-1]
+            if foundations[card & 3] + 1 == card >> 2:
+                moves.append(('T->Fnd', i, card))
+            for j, target_col in enumerate(tableau):
+                if i != j and can_stack(card, target_col[-1]):
+                    moves.append(('T->T', i, j, card))
+        return moves
 
-        self.visited_states.add(state_hash)
+    def dfs(self, tableau, free_cells):
+        visited_states = self.visited_states
+        monitor = self.monitor
+        max_depth = self.max_depth
+        moves_so_far = self.moves
+        dead_ends = 'dead_ends' in self.rules
 
-        for move in self.valid_moves(tableau, free_cells):
-            tableau_copy = copy.deepcopy(tableau)
-            free_cells_copy = copy.deepcopy(free_cells)
-            self.make_move(move, tableau_copy, free_cells_copy)
+        def enter(depth):
+            if self.is_solved():
+                return True
+            if max_depth is not None and depth >= max_depth:
+                self.depth_cutoffs += 1
+                return math.inf
+            if self.key in visited_states:
+                if monitor is not None:
+                    monitor.duplicate(depth)
+                return math.inf
+            visited_states.add(self.key)
+            self.nodes_expanded += 1
+            if not self.nodes_expanded & 255:
+                self.check_limits()
+            self.note_progress()
+            moves = self.valid_moves(tableau, free_cells)
+            last_move = moves_so_far[-1] if moves_so_far else None
+            if dead_ends and self.is_dead(tableau, free_cells, moves, last_move):
+                return math.inf
+            moves = self.order_moves(moves, tableau, last_move)
+            if monitor is not None:
+                monitor.expand(depth, len(moves))
+            return moves
+
+        return self.stack_search(tableau, free_cells, enter, lambda depth, value: value) is True
 
-            self.moves.append(move)
-            print(f"Trying move: {move}")
-            if self.dfs(tableau_copy, free_cells_copy, depth + 1):
+    def stack_search(self, tableau, free_cells, enter, leave):
+        # Depth-first search on an explicit stack of preallocated frames, so
+        # depth is limited by memory rather than Python's recursion limit.
+        # Frame d holds the move list of the node at depth d and the index of
+        # the next move to try; the moves themselves are the undo information,
+        # kept on self.moves (the current path).
+        #   enter(depth) is called on reaching a node and returns True for a
+        #   solution, a number for a leaf (its value) or the moves to expand
+        #   leave(depth, value) is called once every child has been searched,
+        #   with the smallest child value, and returns the node's own value
+        # Returns True with the solution in self.moves, or the root's value.
+        frame_moves = self.frame_moves
+        frame_next = self.frame_next
+        frame_value = self.frame_value
+        make_move, unmake_move = self.make_move, self.unmake_move
+        path = self.moves
+        depth = 0
+        value = enter(0)
+        while True:
+            if value is True:
                 return True
-            print(f"Backtracking from move: {move}")
-            self.moves.pop()
+            if value.__class__ is list:
+                frame_moves[depth] = value
+                frame_next[depth] = 0
+                frame_value[depth] = math.inf
+            elif depth == 0:
+                return value
+            else:
+                # A leaf: report its value to the parent frame
+                depth -= 1
+                unmake_move(path.pop(), tableau, free_cells)
+                if value < frame_value[depth]:
+                    frame_value[depth] = value
+
+            while True:
+                moves = frame_moves[depth]
+                i = frame_next[depth]
+                if i < len(moves):
+                    frame_next[depth] = i + 1
+                    move = moves[i]
+                    make_move(move, tableau, free_cells)
+                    path.append(move)
+                    depth += 1
+                    if depth == len(frame_moves):
+                        self.grow_frames()
+                    value = enter(depth)
+                    break
+                # Every child searched: pop the frame
+                value = leave(depth, frame_value[depth])
+                frame_moves[depth] = None
+                if depth == 0:
+                    return value
+                depth -= 1
+                unmake_move(path.pop(), tableau, free_cells)
+                if value < frame_value[depth]:
+                    frame_value[depth] = value
+
+    def allocate_frames(self):
+        # Frames for depths 0 to max_depth; only the states above max_depth are expanded
+        size = (self.max_depth if self.max_depth is not None else 127) + 1
+        self.frame_moves = [None] * size
+        self.frame_next = [0] * size
+        self.frame_value = [math.inf] * size
+        self.frame_data = [None] * size  # Free for the enter/leave callbacks
+
+    def grow_frames(self):
+        # Only needed without a max_depth: double the frame arrays in place
+        size = len(self.frame_moves)
+        self.frame_moves.extend([None] * size)
+        self.frame_next.extend([0] * size)
+        self.frame_value.extend([math.inf] * size)
+        self.frame_data.extend([None] * size)
+
+    def best_first(self, tableau, free_cells, heuristic, weight):
+        # Priority-queue search ordered by g + weight * h. States are
+        # deduplicated by Zobrist key; the frontier keeps each state packed,
+        # and a popped state is unpacked into the working lists so its
+        # children can be generated with make_move/unmake_move. All of that
+        # is counted against the memory limit (see BEST_FIRST_BYTES_PER_STATE).
+        start = self.key
+        monitor = self.monitor
+        state_limit = self.state_limit
+        shared_visited = self.shared_visited
+        dead_ends = 'dead_ends' in self.rules
+        parents = {start: None}
+        best_g = {start: 0}
+        counter = itertools.count()
+        h = heuristic(tableau, free_cells, self.foundations)
+        frontier = [(weight * h, h, next(counter), 0, start, pack_state(tableau, free_cells, self.foundations))]
+        best_state = start  # Expanded state with the most cards home, for the partial progress
+
+        try:
+            while frontier:
+                _, _, _, g, state, packed = heapq.heappop(frontier)
+                if g > best_g[state]:
+                    continue  # A cheaper path to this state was queued later
+
+                tableau, free_cells, self.foundations = unpack_state(packed)
+                self.key = state
+                if self.is_solved():
+                    if monitor is None:
+                        self.moves = self.path_to(state, parents)
+                    else:
+                        with monitor.phase('path'):
+                            self.moves = self.path_to(state, parents)
+                    return True
+
+                self.visited_states.add(state)
+                self.nodes_expanded += 1
+                if not self.nodes_expanded & 255:
+                    self.check_limits()
+                progress = sum(self.foundations)
+                if progress > self.progress:
+                    self.progress = progress
+                    best_state = state
+                child_g = g + 1
+                last_move = parents[state][1] if parents[state] else None
+                moves = self.valid_moves(tableau, free_cells)
+                if dead_ends and self.is_dead(tableau, free_cells, moves, last_move):
+                    continue
+                moves = self.order_moves(moves, tableau, last_move, rank=False)
+                if monitor is not None:
+                    monitor.expand(g, len(moves))
+                for move in moves:
+                    self.make_move(move, tableau, free_cells)
+                    child = self.key
+                    known_g = best_g.get(child)
+                    if known_g is None:
+                        # A new state can only be in visited_states when that is
+                        # shared with other searches
+                        improved = not (shared_visited and child in self.visited_states)
+                    else:
+                        improved = child_g < known_g
+                    if improved:
+                        if state_limit is not None and known_g is None and len(best_g) >= state_limit:
+                            self.unmake_move(move, tableau, free_cells)
+                            raise MemoryLimitExceeded(f"best-first search exceeded {state_limit} states")
+                        best_g[child] = child_g
+                        parents[child] = (state, move, packed)
+                        h = heuristic(tableau, free_cells, self.foundations)
+                        heapq.heappush(frontier, (child_g + weight * h, h, next(counter), child_g, child,
+                                                  pack_state(tableau, free_cells, self.foundations)))
+                    elif monitor is not None:
+                        monitor.duplicate(child_g)
+                    self.unmake_move(move, tableau, free_cells)
+        finally:
+            if not self.moves:
+                self.partial_moves = self.path_to(best_state, parents)
 
         return False
 
+    def iterative_deepening(self, tableau, free_cells, heuristic, weight):
+        # Depth-first passes bounded by f = g + weight * h, each pass raising
+        # the bound to the smallest f that went over it, until a solution is
+        # found or no state within max_depth moves is left beyond the bound.
+        # With an admissible heuristic and weight 1 the first solution found
+        # is a shortest one.
+        if weight <= 0:
+            raise ValueError(f"Iterative deepening needs a positive weight: {weight}")
+        bound = weight * heuristic(tableau, free_cells, self.foundations)
+        self.iteration = 0
+        self.cutoffs = 0
+        while True:
+            self.iteration += 1
+            result = self.bounded_pass(tableau, free_cells, bound, heuristic, weight)
+            if result is True:
+                return True
+            if result == math.inf:
+                return False
+            bound = result
+
+    def bounded_pass(self, tableau, free_cells, bound, heuristic, weight):
+        # One pass. Returns True once solved, otherwise the smallest f beyond
+        # the bound (math.inf if there is none). The transposition table
+        # skips a state already searched at the same or a smaller depth
+        # during this pass; a state first met deep in the tree is searched
+        # again when it turns up shallower. A subtree searched in full (no
+        # table hit or depth cutoff inside it) also raises its state's
+        # learned h for later passes.
+        table = self.table
+        table_limit = self.table_limit
+        iteration = self.iteration
+        monitor = self.monitor
+        max_depth = self.max_depth
+        moves_so_far = self.moves
+        frame_data = self.frame_data
+        dead_ends = 'dead_ends' in self.rules
+
+        def enter(g):
+            key = self.key
+            entry = table.get(key)
+            if entry is not None and entry[0] == iteration and entry[1] <= g:
+                self.cutoffs += 1
+                if monitor is not None:
+                    monitor.duplicate(g)
+                return math.inf  # Any f it can reach was already reported from the shallower visit
+            h = heuristic(tableau, free_cells, self.foundations)
+            if entry is not None and entry[2] > h:
+                h = entry[2]
+            f = g + weight * h
+            if f > bound:
+                return f
+            if self.is_solved():
+                return True
+            if max_depth is not None and g >= max_depth:
+                self.cutoffs += 1
+                self.depth_cutoffs += 1
+                return math.inf
+
+            if table_limit is not None and len(table) >= table_limit:
+                table.clear()
+            table[key] = (iteration, g, h)
+            self.nodes_expanded += 1
+            if not self.nodes_expanded & 255:
+                self.check_limits()
+            self.note_progress()
+            moves = self.valid_moves(tableau, free_cells)
+            last_move = moves_so_far[-1] if moves_so_far else None
+            if dead_ends and self.is_dead(tableau, free_cells, moves, last_move):
+                return math.inf  # No solution below, in this pass or any other
+            moves = self.order_moves(moves, tableau, last_move)
+            if monitor is not None:
+                monitor.expand(g, len(moves))
+            frame_data[g] = (h, self.cutoffs)
+            return moves
+
+        def leave(g, minimum):
+            h, cutoffs = frame_data[g]
+            if minimum != math.inf and self.cutoffs == cutoffs:
+                table[self.key] = (iteration, g, max(h, (minimum - g) / weight))
+            return minimum
+
+        return self.stack_search(tableau, free_cells, enter, leave)
+
+    def path_to(self, state, parents):
+        # Walk the parent links back to the start. A state may have been
+        # expanded with its columns or free cells in a different order than
+        # the one its child's move was generated from, so replay the moves
+        # from the initial position and remap each onto the actual layout.
+        steps = []
+        while parents[state] is not None:
+            state, move, packed = parents[state]
+            steps.append((move, packed))
+        steps.reverse()
+        return self.replay(steps)
+
+    def replay(self, steps):
+        # Play (move, packed layout the move was generated from) pairs from
+        # the initial position, remapping each move onto the actual layout;
+        # returns the remapped moves
+        tableau = [list(col) for col in self.initial_tableau]
+        free_cells = list(self.initial_free_cells)
+        self.foundations = list(self.initial_foundations)
+        self.key = self.hash_state(tableau, free_cells, self.foundations)
+        moves = []
+        for move, packed in steps:
+            from_tableau, from_free_cells, _ = unpack_state(packed)
+            move = remap_move(move, *match_layout(from_tableau, from_free_cells, tableau, free_cells))
+            self.make_move(move, tableau, free_cells)
+            moves.append(move)
+        return moves
+
     def is_solved(self):
         # The game is solved if all foundations contain 13 cards
-        return all(len(foundation) == 13 for foundation in self.foundations)
+        return all(height == 13 for height in self.foundations)
 
     def hash_state(self, tableau, free_cells, foundations):
-        # Create a unique hashable representation of the state
-        tableau_tuple = tuple(tuple(col) for col in tableau)
-        free_cells_tuple = tuple(free_cells)
-        foundations_tuple = tuple(tuple(foundation) for foundation in foundations)
-        return (tableau_tuple, free_cells_tuple, foundations_tuple)
+        # Canonical 64-bit key, independent of column and free-cell order.
+        # The search keeps self.key updated incrementally instead of calling this per node.
+        return zobrist_key(tableau, free_cells, foundations)
 
     def valid_moves(self, tableau, free_cells):
+        # Safe foundation moves are never worth branching on: when there are
+        # any, they are the only child, played as a single compound step
+        if self.auto_foundation:
+            steps = self.safe_auto_moves(tableau, free_cells)
+            if steps:
+                return [('Auto', steps)]
+
         moves = []
 
         # Move from tableau to free cell
         for i, col in enumerate(tableau):
-            if col and None in free_cells:
-                free_cell_idx = free_cells.index(None)
+            if col and 0 in free_cells:
+                free_cell_idx = free_cells.index(0)
                 moves.append(('T->F', i, free_cell_idx, col[-1]))
 
         # Move from free cell to tableau
@@ -76,12 +845,25 @@ class FreeCellSolver:
                     if self.can_place(card, col):
                         moves.append(('F->T', i, j, card))
 
-        # Move between tableau columns
+        # Move between tableau columns. With supermoves a run of up to
+        # (free cells + 1) * 2 ** (empty columns) cards moves at once; an
+        # empty target column does not count towards that capacity.
+        free_count = free_cells.count(0)
+        empty_count = sum(1 for col in tableau if not col)
         for i, col in enumerate(tableau):
             if col:
+                run = sequence_length(col) if self.supermoves else 1
                 for j, target_col in enumerate(tableau):
-                    if i != j and self.can_place(col[-1], target_col):
-                        moves.append(('T->T', i, j, col[-1]))
+                    if i == j:
+                        continue
+                    if target_col:
+                        count = (target_col[-1] >> 2) - (col[-1] >> 2)
+                        if (1 <= count <= run and count <= (free_count + 1) << empty_count
+                                and can_stack(col[-count], target_col[-1])):
+                            moves.append(self.tableau_move(i, j, col, count))
+                    else:
+                        for count in range(1, min(run, (free_count + 1) << (empty_count - 1)) + 1):
+                            moves.append(self.tableau_move(i, j, col, count))
 
         # Move from tableau to foundation
         for i, col in enumerate(tableau):
@@ -95,45 +877,212 @@ class FreeCellSolver:
 
         return moves
 
+    def order_moves(self, moves, tableau, last_move, rank=True):
+        # Drop moves ruled out by the enabled pruning rules and rank the rest.
+        # Best-first search passes rank=False: its heap sets the order already.
+        rules = self.rules
+        if not rules or (len(moves) == 1 and moves[0][0] == 'Auto'):
+            return moves
+
+        first_empty = None
+        if 'dedupe_empty_targets' in rules:
+            first_empty = next((i for i, col in enumerate(tableau) if not col), None)
+
+        kept = []
+        for move in moves:
+            move_type = move[0]
+            if move_type in ('T->T', 'T->T*', 'F->T') and not tableau[move[2]]:
+                if (move_type != 'F->T' and 'lone_to_empty' in rules
+                        and len(tableau[move[1]]) == (move[4] if move_type == 'T->T*' else 1)):
+                    self.stats['lone_to_empty'] += 1
+                    continue
+                if first_empty is not None and move[2] != first_empty:
+                    self.stats['dedupe_empty_targets'] += 1
+                    continue
+            if last_move is not None and 'no_reversal' in rules and is_reversal(last_move, move):
+                self.stats['no_reversal'] += 1
+                continue
+            kept.append(move)
+
+        if rank and 'rank_moves' in rules:
+            self.stats['rank_moves'] += 1
+            kept.sort(key=lambda move: self.move_score(move, tableau), reverse=True)
+        return kept
+
+    def move_score(self, move, tableau):
+        # Higher is tried first: foundation moves, then moves that empty a
+        # column or uncover a low card; parking cards in free cells comes last
+        move_type = move[0]
+        if move_type in ('T->Fnd', 'F->Fnd', 'Auto'):
+            return 100
+        if move_type == 'F->T':
+            return 20
+        src_col = tableau[move[1]]
+        count = move[4] if move_type == 'T->T*' else 1
+        if len(src_col) == count:
+            score = 30
+        else:
+            # Dig towards the lowest card left in the source column
+            score = 14 - min(card >> 2 for card in src_col[:-count])
+        if move_type == 'T->F':
+            score -= 15
+        return score
+
+    def tableau_move(self, src, dest, col, count):
+        if count == 1:
+            return ('T->T', src, dest, col[-1])
+        return ('T->T*', src, dest, col[-count], count)
+
+    def safe_auto_moves(self, tableau, free_cells):
+        # Collect every safe foundation move, repeating until none is left
+        # (one move can make the next card safe). The moves are applied while
+        # collecting and reverted before returning.
+        steps = []
+        progress = True
+        while progress:
+            progress = False
+            for i, card in enumerate(free_cells):
+                if card and self.can_place_in_foundation(card) and is_safe_auto_move(card, self.foundations):
+                    step = ('F->Fnd', i, card)
+                    self.make_move(step, tableau, free_cells)
+                    steps.append(step)
+                    progress = True
+            for i, col in enumerate(tableau):
+                while col and self.can_place_in_foundation(col[-1]) and is_safe_auto_move(col[-1], self.foundations):
+                    step = ('T->Fnd', i, col[-1])
+                    self.make_move(step, tableau, free_cells)
+                    steps.append(step)
+                    progress = True
+        for step in reversed(steps):
+            self.unmake_move(step, tableau, free_cells)
+        return tuple(steps)
+
+    def expand_supermove(self, src, dest, count, tableau, free_cells, steps):
+        # Play a supermove as single-card moves through free cells and empty
+        # columns, appending each to steps. Up to (free cells + 1) cards go
+        # via free cells directly; larger runs are split in half and the top
+        # half parked in an empty column, recursively.
+        if count == 1:
+            step = ('T->T', src, dest, tableau[src][-1])
+            self.make_move(step, tableau, free_cells)
+            steps.append(step)
+            return
+
+        cells = [i for i, card in enumerate(free_cells) if not card]
+        if count <= len(cells) + 1:
+            used = cells[:count - 1]
+            for cell in used:
+                step = ('T->F', src, cell, tableau[src][-1])
+                self.make_move(step, tableau, free_cells)
+                steps.append(step)
+            self.expand_supermove(src, dest, 1, tableau, free_cells, steps)
+            for cell in reversed(used):
+                step = ('F->T', cell, dest, free_cells[cell])
+                self.make_move(step, tableau, free_cells)
+                steps.append(step)
+            return
+
+        spare = next(i for i, col in enumerate(tableau) if not col and i != dest)
+        half = count // 2
+        self.expand_supermove(src, spare, half, tableau, free_cells, steps)
+        self.expand_supermove(src, dest, count - half, tableau, free_cells, steps)
+        self.expand_supermove(spare, dest, half, tableau, free_cells, steps)
+
     def can_place(self, card, column):
         if not column:
             return True  # Can place any card in an empty column
-        top_card = column[-1]
-        card_value, card_suit = card.split(' of ')
-        top_value, top_suit = top_card.split(' of ')
-        value_order = values.index(card_value)
-        top_value_order = values.index(top_value)
-
         # Different color and descending order
-        return (value_order + 1 == top_value_order) and ((card_suit in ['Hearts', 'Diamonds']) != (top_suit in ['Hearts', 'Diamonds']))
+        return can_stack(card, column[-1])
 
     def can_place_in_foundation(self, card):
-        value, suit = card.split(' of ')
-        index = suits.index(suit)
-        if not self.foundations[index]:
-            return value == 'A'
-        last_value = self.foundations[index][-1].split(' of ')[0]
-        return values.index(last_value) + 1 == values.index(value)
+        # Rank (card >> 2) must be one above the height of its suit's foundation
+        return self.foundations[card & 3] + 1 == card >> 2
 
     def make_move(self, move, tableau, free_cells):
+        # Apply move in place and update the Zobrist key: only the moved
+        # card's location (the card beneath it or a free cell) changes
+        move_type = move[0]
+
+        if move_type == 'T->F':
+            src, dest, card = move[1], move[2], move[3]
+            col = tableau[src]
+            col.pop()
+            free_cells[dest] = card
+            self.key ^= ZOBRIST[card][col[-1] if col else 0] ^ ZOBRIST[card][FREE_CELL]
+        elif move_type == 'F->T':
+            src, dest, card = move[1], move[2], move[3]
+            col = tableau[dest]
+            self.key ^= ZOBRIST[card][FREE_CELL] ^ ZOBRIST[card][col[-1] if col else 0]
+            col.append(card)
+            free_cells[src] = 0
+        elif move_type == 'T->T':
+            src, dest, card = move[1], move[2], move[3]
+            src_col, dest_col = tableau[src], tableau[dest]
+            src_col.pop()
+            self.key ^= ZOBRIST[card][src_col[-1] if src_col else 0] ^ ZOBRIST[card][dest_col[-1] if dest_col else 0]
+            dest_col.append(card)
+        elif move_type == 'T->T*':
+            src, dest, card, count = move[1], move[2], move[3], move[4]
+            src_col, dest_col = tableau[src], tableau[dest]
+            below = dest_col[-1] if dest_col else 0
+            dest_col.extend(src_col[-count:])
+            del src_col[-count:]
+            self.key ^= ZOBRIST[card][src_col[-1] if src_col else 0] ^ ZOBRIST[card][below]
+        elif move_type == 'Auto':
+            for step in move[1]:
+                self.make_move(step, tableau, free_cells)
+        elif move_type == 'T->Fnd':
+            src, card = move[1], move[2]
+            col = tableau[src]
+            col.pop()
+            self.key ^= ZOBRIST[card][col[-1] if col else 0]
+            self.foundations[card & 3] += 1
+        elif move_type == 'F->Fnd':
+            src, card = move[1], move[2]
+            self.key ^= ZOBRIST[card][FREE_CELL]
+            self.foundations[card & 3] += 1
+            free_cells[src] = 0
+
+    def unmake_move(self, move, tableau, free_cells):
+        # Exact inverse of make_move, foundations and key included
         move_type = move[0]
 
         if move_type == 'T->F':
             src, dest, card = move[1], move[2], move[3]
-            free_cells[dest] = tableau[src].pop()
+            col = tableau[src]
+            self.key ^= ZOBRIST[card][col[-1] if col else 0] ^ ZOBRIST[card][FREE_CELL]
+            col.append(card)
+            free_cells[dest] = 0
         elif move_type == 'F->T':
             src, dest, card = move[1], move[2], move[3]
-            tableau[dest].append(free_cells[src])
-            free_cells[src] = None
+            col = tableau[dest]
+            col.pop()
+            self.key ^= ZOBRIST[card][FREE_CELL] ^ ZOBRIST[card][col[-1] if col else 0]
+            free_cells[src] = card
         elif move_type == 'T->T':
             src, dest, card = move[1], move[2], move[3]
-            tableau[dest].append(tableau[src].pop())
+            src_col, dest_col = tableau[src], tableau[dest]
+            dest_col.pop()
+            self.key ^= ZOBRIST[card][src_col[-1] if src_col else 0] ^ ZOBRIST[card][dest_col[-1] if dest_col else 0]
+            src_col.append(card)
+        elif move_type == 'T->T*':
+            src, dest, card, count = move[1], move[2], move[3], move[4]
+            src_col, dest_col = tableau[src], tableau[dest]
+            below = src_col[-1] if src_col else 0
+            src_col.extend(dest_col[-count:])
+            del dest_col[-count:]
+            self.key ^= ZOBRIST[card][below] ^ ZOBRIST[card][dest_col[-1] if dest_col else 0]
+        elif move_type == 'Auto':
+            for step in reversed(move[1]):
+                self.unmake_move(step, tableau, free_cells)
         elif move_type == 'T->Fnd':
             src, card = move[1], move[2]
-            suit = card.split(' of ')[1]
-            self.foundations[suits.index(suit)].append(tableau[src].pop())
+            col = tableau[src]
+            self.key ^= ZOBRIST[card][col[-1] if col else 0]
+            self.foundations[card & 3] -= 1
+            col.append(card)
         elif move_type == 'F->Fnd':
             src, card = move[1], move[2]
-            suit = card.split(' of ')[1]
-            self.foundations[suits.index(suit)].append(free_cells[src])
-            free_cells[src] = None
+            self.key ^= ZOBRIST[card][FREE_CELL]
+            self.foundations[card & 3] -= 1
+            free_cells[src] = card
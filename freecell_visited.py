@@ -0,0 +1,180 @@
+import math
+import sys
+from array import array
+
+# Visited-state backends for FreeCellSolver. All of them store the solver's
+# 64-bit Zobrist keys, support `key in visited` and visited.add(key), and
+# report their counters through stats().
+#
+# exact: a plain set; raises MemoryLimitExceeded past its memory ceiling
+# clock: fixed-size 4-way set-associative table with clock (second chance)
+#        eviction; an evicted state may be searched again but nothing is
+#        ever skipped wrongly
+# bloom: Bloom filter sized for a target false-positive rate; it never
+#        forgets, but a false positive skips a state that was never searched
+# clock and bloom preallocate their whole memory_limit, so they need one.
+
+EXACT_BYTES_PER_KEY = 64  # Set slot plus the int object, roughly
+
+
+class MemoryLimitExceeded(Exception):
+    pass
+
+
+class ExactVisitedSet:
+    def __init__(self, memory_limit=None):
+        self.keys = set()
+        self.max_keys = None if memory_limit is None else memory_limit // EXACT_BYTES_PER_KEY
+        self.hits = 0
+
+    def __contains__(self, key):
+        if key in self.keys:
+            self.hits += 1
+            return True
+        return False
+
+    def add(self, key):
+        self.keys.add(key)
+        if self.max_keys is not None and len(self.keys) > self.max_keys:
+            raise MemoryLimitExceeded(f"visited set exceeded {self.max_keys} keys")
+
+    def __len__(self):
+        return len(self.keys)
+
+    def memory_bytes(self):
+        return sys.getsizeof(self.keys) + 32 * len(self.keys)
+
+    def stats(self):
+        return {'backend': 'exact', 'entries': len(self.keys), 'hits': self.hits, 'evictions': 0,
+                'memory_bytes': self.memory_bytes(), 'fp_rate': 0.0}
+
+
+class ClockVisitedTable:
+    WAYS = 4
+
+    def __init__(self, memory_limit):
+        # 8 bytes per key slot, one reference byte per slot and one clock hand byte per bucket
+        slots = max(self.WAYS, memory_limit * self.WAYS // (9 * self.WAYS + 1) // self.WAYS * self.WAYS)
+        self.keys = array('Q', bytes(8 * slots))
+        self.referenced = bytearray(slots)
+        self.buckets = slots // self.WAYS
+        self.hands = bytearray(self.buckets)
+        self.has_zero = False  # 0 marks an empty slot, so key 0 is kept aside
+        self.entries = 0
+        self.hits = 0
+        self.evictions = 0
+
+    def __contains__(self, key):
+        if key == 0:
+            found = self.has_zero
+        else:
+            base = (key % self.buckets) * self.WAYS
+            found = False
+            for slot in range(base, base + self.WAYS):
+                if self.keys[slot] == key:
+                    self.referenced[slot] = 1
+                    found = True
+                    break
+        if found:
+            self.hits += 1
+        return found
+
+    def add(self, key):
+        if key == 0:
+            self.entries += not self.has_zero
+            self.has_zero = True
+            return
+        bucket = key % self.buckets
+        base = bucket * self.WAYS
+        keys = self.keys
+        for slot in range(base, base + self.WAYS):
+            if keys[slot] == key:
+                return
+            if keys[slot] == 0:
+                keys[slot] = key
+                self.referenced[slot] = 1
+                self.entries += 1
+                return
+        # Bucket full: sweep the clock hand, clearing reference bits, until
+        # it finds a slot that has not been used since the last sweep
+        hand = self.hands[bucket]
+        while self.referenced[base + hand]:
+            self.referenced[base + hand] = 0
+            hand = (hand + 1) % self.WAYS
+        keys[base + hand] = key
+        self.referenced[base + hand] = 1
+        self.hands[bucket] = (hand + 1) % self.WAYS
+        self.evictions += 1
+
+    def __len__(self):
+        return self.entries
+
+    def memory_bytes(self):
+        return len(self.keys) * self.keys.itemsize + len(self.referenced) + len(self.hands)
+
+    def stats(self):
+        return {'backend': 'clock', 'entries': self.entries, 'hits': self.hits, 'evictions': self.evictions,
+                'memory_bytes': self.memory_bytes(), 'fp_rate': 0.0}
+
+
+class BloomVisitedFilter:
+    def __init__(self, memory_limit=None, fp_rate=0.001, capacity=10_000_000):
+        # Size for `capacity` keys at fp_rate, capped at memory_limit bytes.
+        # Past that capacity the filter keeps working with a rising FP rate.
+        bits = math.ceil(-capacity * math.log(fp_rate) / math.log(2) ** 2)
+        if memory_limit is not None:
+            bits = min(bits, memory_limit * 8)
+        self.num_bits = max(64, bits)
+        self.num_hashes = max(1, round(-math.log2(fp_rate)))
+        self.bits = bytearray((self.num_bits + 7) // 8)
+        self.entries = 0
+        self.hits = 0
+
+    def positions(self, key):
+        # Double hashing: the two halves of the 64-bit key give k bit positions
+        h1 = key & 0xFFFFFFFF
+        h2 = (key >> 32) | 1
+        num_bits = self.num_bits
+        return [(h1 + i * h2) % num_bits for i in range(self.num_hashes)]
+
+    def __contains__(self, key):
+        bits = self.bits
+        for position in self.positions(key):
+            if not bits[position >> 3] & (1 << (position & 7)):
+                return False
+        self.hits += 1
+        return True
+
+    def add(self, key):
+        bits = self.bits
+        for position in self.positions(key):
+            bits[position >> 3] |= 1 << (position & 7)
+        self.entries += 1
+
+    def __len__(self):
+        return self.entries
+
+    def memory_bytes(self):
+        return len(self.bits)
+
+    def estimated_fp_rate(self):
+        return (1 - math.exp(-self.num_hashes * self.entries / self.num_bits)) ** self.num_hashes
+
+    def stats(self):
+        return {'backend': 'bloom', 'entries': self.entries, 'hits': self.hits, 'evictions': 0,
+                'memory_bytes': self.memory_bytes(), 'fp_rate': self.estimated_fp_rate()}
+
+
+VISITED_BACKENDS = ('exact', 'clock', 'bloom')
+
+
+def make_visited(backend="exact", memory_limit=None, fp_rate=0.001):
+    if backend == "exact":
+        return ExactVisitedSet(memory_limit)
+    if backend not in VISITED_BACKENDS:
+        raise ValueError(f"Unknown visited backend: {backend!r}")
+    if memory_limit is None:
+        raise ValueError(f"The {backend} visited backend needs a memory_limit")
+    if backend == "clock":
+        return ClockVisitedTable(memory_limit)
+    return BloomVisitedFilter(memory_limit, fp_rate)
@@ -0,0 +1,178 @@
+import queue
+import threading
+from tkinter import messagebox
+from freecell_instrument import SearchMonitor
+from freecell_optimize import optimize_solution
+from freecell_solver import format_move
+
+# Background solving for the GUIs. Tk may only be touched from its own
+# thread, so the worker never calls back into the GUI: it puts events on a
+# queue that the GUI drains from root.after callbacks.
+#   ('progress', snapshot)                every `interval` seconds (see freecell_instrument)
+#   ('done', status, moves, hit, report)  once; moves are optimized single-card moves or
+#                                         None, hit is True for a cache hit and report is
+#                                         the optimizer's (None without a solution)
+#   ('error', message)                    instead of 'done' if the solve raised
+# SolveController runs those solves for a GUI and plays their solutions back.
+
+POLL_INTERVAL = 100  # ms between checks on the background solver
+PLAYBACK_DELAY = 300  # ms between steps when playing a solution back
+
+
+class SolveWorker(threading.Thread):
+    def __init__(self, cache, tableau, free_cells, foundations, strategy="weighted", heuristic=None, weight=None,
+                 time_limit=None, interval=0.25, **options):
+        super().__init__(daemon=True)
+        # Private copies: the GUI's lists may change while the search runs
+        self.position = ([list(col) for col in tableau], list(free_cells), [list(pile) for pile in foundations])
+        self.cache = cache
+        self.strategy = strategy
+        self.heuristic = heuristic
+        self.weight = weight
+        self.time_limit = time_limit
+        self.interval = interval
+        self.options = options
+        self.events = queue.Queue()
+        self.stop = threading.Event()
+
+    def cancel(self):
+        # The search notices within 256 nodes and finishes with status 'cancelled'
+        self.stop.set()
+
+    def run(self):
+        monitor = SearchMonitor(reporter=lambda snapshot: self.events.put(('progress', snapshot)),
+                                interval=self.interval)
+        try:
+            moves, status, hit = self.cache.solve(*self.position, self.strategy, self.heuristic, self.weight,
+                                                  self.time_limit, self.stop, monitor=monitor, **self.options)
+            report = None
+            if moves is not None:
+                moves, report = optimize_solution(*self.position, moves)
+            self.events.put(('done', status, moves, hit, report))
+        except Exception as error:
+            self.events.put(('error', str(error)))
+
+    def poll(self):
+        # Every event queued so far, without blocking
+        events = []
+        while True:
+            try:
+                events.append(self.events.get_nowait())
+            except queue.Empty:
+                return events
+
+
+class SolveController:
+    # The GUIs' Solve and Cancel buttons: runs a SolveWorker, shows its
+    # progress in status_label and plays a solution back one step at a time,
+    # all from root.after callbacks on the Tk thread. play_step(move) applies
+    # a single-card move to the GUI's model and redraws the board; the
+    # optional on_finished(status, moves, hit, report) sees each finished
+    # solve before its playback starts.
+    def __init__(self, root, cache, solve_button, cancel_button, status_label, play_step, on_finished=None):
+        self.root = root
+        self.cache = cache
+        self.solve_button = solve_button
+        self.cancel_button = cancel_button
+        self.status_label = status_label
+        self.play_step = play_step
+        self.on_finished = on_finished
+        self.worker = None  # Background SolveWorker while a solve runs
+        self.playback = []  # Solution steps still to be played
+        self.playback_total = 0
+        self.playback_job = None
+
+    def busy(self):
+        # The GUI's model must not change under a solve or its playback
+        return self.worker is not None or self.playback_job is not None
+
+    def solve(self, tableau, free_cells, foundations):
+        # Solve on a background thread; poll picks up its progress and result
+        if self.worker is not None:
+            return
+        self.stop_playback()
+        self.worker = SolveWorker(self.cache, tableau, free_cells, foundations)
+        self.worker.start()
+        self.solve_button.config(state="disabled")
+        self.cancel_button.config(state="normal")
+        self.status_label.config(text="Solving...")
+        self.root.after(POLL_INTERVAL, self.poll)
+
+    def poll(self):
+        worker = self.worker
+        for event in worker.poll():
+            if event[0] == 'progress':
+                snapshot = event[1]
+                self.status_label.config(text=f"{snapshot['nodes_per_sec']:.0f} nodes/sec  depth {snapshot['depth']}  "
+                                              f"best {snapshot['progress']}/52 cards home")
+                continue
+            self.worker = None
+            self.solve_button.config(state="normal")
+            if event[0] == 'error':
+                self.cancel_button.config(state="disabled")
+                self.status_label.config(text="Solver error")
+                messagebox.showerror("Solver error", event[1])
+            elif worker.stop.is_set():
+                self.cancel_button.config(state="disabled")
+                self.status_label.config(text="Cancelled")
+            else:
+                self.finished(*event[1:])
+            return
+        self.root.after(POLL_INTERVAL, self.poll)
+
+    def finished(self, status, moves, hit, report):
+        if self.on_finished is not None:
+            self.on_finished(status, moves, hit, report)
+        if moves is None:
+            self.cancel_button.config(state="disabled")
+            self.status_label.config(text="No solution found")
+            messagebox.showinfo("Solution", "No solution found")
+            return
+        if not moves:
+            self.cancel_button.config(state="disabled")
+            self.status_label.config(text="Already solved")
+            return
+        # Play the solution back one step at a time; Cancel stops the playback
+        self.playback = list(moves)
+        self.playback_total = len(moves)
+        self.playback_job = self.root.after(PLAYBACK_DELAY, self.play_next_step)
+
+    def play_next_step(self):
+        move = self.playback.pop(0)
+        self.play_step(move)
+        self.status_label.config(text=f"Step {self.playback_total - len(self.playback)}/{self.playback_total}: "
+                                      f"{format_move(move)}")
+        if self.playback:
+            self.playback_job = self.root.after(PLAYBACK_DELAY, self.play_next_step)
+        else:
+            self.playback_job = None
+            self.cancel_button.config(state="disabled")
+
+    def stop_playback(self):
+        if self.playback_job is not None:
+            self.root.after_cancel(self.playback_job)
+            self.playback_job = None
+        self.playback = []
+
+    def cancel(self):
+        if self.worker is not None:
+            self.worker.cancel()
+            self.status_label.config(text="Cancelling...")
+        else:
+            self.stop_playback()
+            self.cancel_button.config(state="disabled")
+            self.status_label.config(text="Playback stopped")
+
+    def reset(self):
+        if self.worker is not None:
+            self.worker.cancel()
+        self.stop_playback()
+        self.cancel_button.config(state="disabled")
+        self.status_label.config(text="")
+
+    def close(self):
+        # Let a running search stop, so nothing uses the cache once it is closed
+        if self.worker is not None:
+            self.worker.cancel()
+            self.worker.join()
+        self.stop_playback()